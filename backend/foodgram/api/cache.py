@@ -0,0 +1,161 @@
+import time
+from functools import wraps
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+VERSION_KEY = 'recipes:version'
+SHARED_VERSION_KEY = 'recipes:version:shared'
+AUTHOR_VERSION_KEY = 'recipes:version:author:{}'
+RECIPE_VERSION_KEY = 'recipes:version:recipe:{}'
+USER_VERSION_KEY = 'recipes:version:user:{}'
+MODEL_VERSION_KEY = 'catalog:version:{}'
+PANTRY_VERSION_KEY = 'recipes:version:pantry'
+SEARCH_VERSION_KEY = 'recipes:version:search'
+SEARCH_STATS_KEY = 'recipes:search:stats:{}'
+SNAPSHOT_KEY = 'recipes:snapshot:{}:{}:{}:{}'
+
+
+def get_recipe_cache():
+    return caches[settings.RECIPES_CACHE]
+
+
+def _initial_version():
+    # Версия стартует с текущего времени: если счётчик вытеснят из кэша,
+    # новая версия не совпадёт ни с одной из уже выданных.
+    return time.time_ns() // 1000
+
+
+def get_versions(*keys):
+    cache = get_recipe_cache()
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(*keys):
+    cache = get_recipe_cache()
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), timeout=None)
+
+
+def bump_recipe_version(author_id=None, recipe_ids=()):
+    """Сбрасывает кэш списков и рецептов после изменения рецепта автора."""
+    keys = [VERSION_KEY]
+    if author_id is not None:
+        keys.append(AUTHOR_VERSION_KEY.format(author_id))
+    keys.extend(RECIPE_VERSION_KEY.format(pk) for pk in recipe_ids)
+    bump_versions(*keys)
+
+
+def bump_recipe_counters(recipe_ids):
+    """Сбрасывает снимки и страницы рецептов после смены их счётчиков.
+
+    Списки не сбрасываются: отметка в избранном не должна чистить весь
+    кэш, а счётчики в списках отстают не дольше RECIPES_CACHE_TIMEOUT.
+    """
+    bump_versions(*(RECIPE_VERSION_KEY.format(pk) for pk in recipe_ids))
+
+
+def bump_shared_version(model):
+    """Сбрасывает весь кэш рецептов: изменились теги или ингредиенты."""
+    bump_versions(
+        VERSION_KEY,
+        SHARED_VERSION_KEY,
+        MODEL_VERSION_KEY.format(model._meta.label_lower)
+    )
+
+
+def bump_search_version():
+    """Сбрасывает статистику поискового индекса после его изменения."""
+    bump_versions(SEARCH_VERSION_KEY)
+
+
+def bump_user_version(user_id):
+    """Меняет ETag рецептов для пользователя, например после подписки."""
+    bump_versions(USER_VERSION_KEY.format(user_id))
+
+
+def model_etag(model):
+    """ETag списка и объектов справочника по версии его модели."""
+    def etag_func(request, *args, **kwargs):
+        version, = get_versions(
+            MODEL_VERSION_KEY.format(model._meta.label_lower)
+        )
+        return str(version)
+    return etag_func
+
+
+def recipe_etag(request, pk=None, **kwargs):
+    """ETag рецепта: версии рецепта и справочников плюс версия читателя."""
+    keys = [SHARED_VERSION_KEY, RECIPE_VERSION_KEY.format(pk)]
+    user = request.user
+    if user.is_authenticated:
+        keys.append(USER_VERSION_KEY.format(user.id))
+    versions = '-'.join(str(version) for version in get_versions(*keys))
+    # Ответы с ?fields= и ?omit= - разные представления одного рецепта.
+    fieldset = '&'.join(
+        f'{name}={request.GET[name]}'
+        for name in ('fields', 'omit') if request.GET.get(name)
+    )
+    if fieldset:
+        return f'{user.id}-{versions}-{md5(fieldset.encode()).hexdigest()}'
+    return f'{user.id}-{versions}'
+
+
+def get_snapshot_keys(recipe_ids, host):
+    """Ключи снимков рецептов для текущих версий рецептов и справочников."""
+    shared, *versions = get_versions(
+        SHARED_VERSION_KEY,
+        *(RECIPE_VERSION_KEY.format(pk) for pk in recipe_ids)
+    )
+    return {
+        pk: SNAPSHOT_KEY.format(host, pk, shared, version)
+        for pk, version in zip(recipe_ids, versions)
+    }
+
+
+def get_cache_key(request, pk=None):
+    params = sorted(
+        (key, sorted(request.query_params.getlist(key)))
+        for key in request.query_params
+    )
+    author_id = request.query_params.get('author')
+    if pk is not None:
+        versions = get_versions(
+            SHARED_VERSION_KEY, RECIPE_VERSION_KEY.format(pk)
+        )
+    elif author_id:
+        versions = get_versions(
+            SHARED_VERSION_KEY, AUTHOR_VERSION_KEY.format(author_id)
+        )
+    else:
+        versions = get_versions(VERSION_KEY)
+    raw = f'{request.get_host()}{request.path}{params}{versions}'
+    return f'recipes:response:{md5(raw.encode()).hexdigest()}'
+
+
+def cache_anonymous_response(view_method):
+    """Кэширует ответы анонимным пользователям до смены версии рецептов."""
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return view_method(self, request, *args, **kwargs)
+        cache = get_recipe_cache()
+        key = get_cache_key(request, kwargs.get('pk'))
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RECIPES_CACHE_TIMEOUT)
+        return response
+    return wrapper
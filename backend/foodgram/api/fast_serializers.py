@@ -0,0 +1,100 @@
+"""Снимки рецептов без полей DRF.
+
+Выдаёт те же словари, что build_recipe_snapshots, но строит их из строк
+values_list() по заранее вычисленным спискам полей: без экземпляров
+Tag, Ingredient и IngredientInRecipe и без вложенных сериализаторов.
+"""
+from collections import defaultdict
+from functools import lru_cache
+
+from recipes.models import IngredientInRecipe, Tag
+from .serializers import (IngredientSerializer, RecipeReadSerializer,
+                          SnapshotUserSerializer, TagSerializer)
+
+RECIPE_COLUMNS = (
+    'id', 'name', 'text', 'cooking_time',
+    'favorites_count', 'shopping_cart_count',
+)
+OVERLAY_FIELDS = ('is_favorited', 'is_in_shopping_cart')
+
+
+@lru_cache(maxsize=None)
+def get_field_maps():
+    """Порядок полей вложенных объектов, как у сериализаторов DRF."""
+    return {
+        'author': tuple(
+            name for name in SnapshotUserSerializer().fields
+            if name != 'is_subscribed'
+        ),
+        'tags': tuple(TagSerializer().fields),
+        'ingredients': tuple(IngredientSerializer().fields),
+    }
+
+
+def get_tags(recipe_ids, fields):
+    tags = defaultdict(list)
+    rows = Tag.objects.filter(recipe__in=recipe_ids).values_list(
+        'recipe', *fields
+    )
+    for recipe_id, *values in rows:
+        tags[recipe_id].append(dict(zip(fields, values)))
+    return tags
+
+
+def get_ingredients(recipe_ids, fields):
+    ingredients = defaultdict(list)
+    rows = IngredientInRecipe.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list(
+        'recipe_id', *(f'ingredient__{name}' for name in fields), 'amount'
+    )
+    for recipe_id, *values, amount in rows:
+        ingredient = dict(zip(fields, values))
+        ingredient['amount'] = amount
+        ingredients[recipe_id].append(ingredient)
+    return ingredients
+
+
+def build_fast_recipe_snapshots(recipes, context):
+    """Снимки рецептов: не больше двух запросов на всю страницу."""
+    fields = context.get('fields')
+    names = [
+        name for name in RecipeReadSerializer.Meta.fields
+        if fields is None or name in fields
+    ]
+    field_maps = get_field_maps()
+    recipe_ids = [recipe.id for recipe in recipes]
+    tags = ingredients = None
+    if 'tags' in names:
+        tags = get_tags(recipe_ids, field_maps['tags'])
+    if 'ingredients' in names:
+        ingredients = get_ingredients(
+            recipe_ids, field_maps['ingredients']
+        )
+    request = context['request']
+    snapshots = {}
+    for recipe in recipes:
+        snapshot = {}
+        for name in names:
+            if name in RECIPE_COLUMNS:
+                snapshot[name] = getattr(recipe, name)
+            elif name == 'tags':
+                snapshot[name] = tags[recipe.id]
+            elif name == 'ingredients':
+                snapshot[name] = ingredients[recipe.id]
+            elif name == 'author':
+                author = recipe.author
+                snapshot[name] = {
+                    field: getattr(author, field)
+                    for field in field_maps['author']
+                }
+                snapshot[name]['is_subscribed'] = False
+            elif name == 'image':
+                snapshot[name] = (
+                    request.build_absolute_uri(recipe.image.url)
+                    if recipe.image else None
+                )
+            elif name in OVERLAY_FIELDS:
+                snapshot[name] = False
+        snapshots[recipe.id] = snapshot
+    return snapshots
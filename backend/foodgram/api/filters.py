@@ -1,11 +1,8 @@
+from django.db.models import Case, FloatField, Value, When
 from django_filters.rest_framework import FilterSet, filters
-from rest_framework.filters import SearchFilter
 
-from recipes.models import Recipe, Tag
-
-
-class IngredientFilter(SearchFilter):
-    search_param = 'name'
+from recipes.models import Recipe, Tag, get_tag_keys
+from .search import pantry_index, rank_recipes
 
 
 class RecipeFilter(FilterSet):
@@ -15,7 +12,8 @@ class RecipeFilter(FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
-        queryset=Tag.objects.all()
+        queryset=Tag.objects.all(),
+        method='filter_tags'
     )
     is_favorited = filters.BooleanFilter(
         method='filter_is_favorited'
@@ -23,6 +21,20 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(
+        method='filter_search'
+    )
+    pantry = filters.BooleanFilter(
+        method='filter_pantry'
+    )
+
+    def filter_tags(self, queryset, name, tags):
+        if not tags:
+            return queryset
+        # На PostgreSQL это оператор ?| по GIN-индексу recipe_tag_keys_idx.
+        return queryset.filter(
+            tag_keys__has_any_keys=list(get_tag_keys(tag.id for tag in tags))
+        )
 
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
@@ -36,6 +48,34 @@ class RecipeFilter(FilterSet):
             return queryset.filter(is_in_shopping_cart__author=user)
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        if value:
+            return rank_recipes(queryset, value)
+        return queryset
+
+    def filter_pantry(self, queryset, name, value):
+        user = self.request.user
+        if not value:
+            return queryset
+        if user.is_anonymous:
+            return queryset.none()
+        matches = pantry_index.match(
+            user.pantry.values_list('ingredient_id', flat=True)
+        )
+        if not matches:
+            return queryset.none()
+        return queryset.filter(
+            id__in=[recipe_id for _, recipe_id in matches]
+        ).annotate(
+            pantry_coverage=Case(
+                *(
+                    When(id=recipe_id, then=Value(coverage))
+                    for coverage, recipe_id in matches
+                ),
+                output_field=FloatField()
+            )
+        ).order_by('-pantry_coverage', '-pub_date', '-id')
+
     class Meta:
         model = Recipe
         fields = ('tags', 'author', 'is_favorited')
@@ -1,4 +1,7 @@
-import reportlab
+import os
+from functools import lru_cache
+from itertools import islice
+
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from reportlab.lib.pagesizes import A4
@@ -6,18 +9,26 @@ from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
 from reportlab.lib.units import cm
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+from reportlab.platypus import (Paragraph, SimpleDocTemplate, Spacer, Table,
+                                TableStyle)
 
 from foodgram.settings import MEDIA_ROOT
 
+FONT_NAME = 'CaviarDreams'
+FONT_PATH = os.path.join(MEDIA_ROOT, 'fonts', 'caviar-dreams.ttf')
+TABLE_HEADER = ('Ингредиент', 'Количество', 'Единица')
+TABLE_CHUNK_SIZE = 40
+TABLE_COL_WIDTHS = (11 * cm, 3 * cm, 3 * cm)
+
 
-def generate_pdf_file(text, response):
-    reportlab.rl_config.TTFSearchPath.append(str(MEDIA_ROOT) + '/fonts')
-    pdfmetrics.registerFont(TTFont('CaviarDreams', 'caviar-dreams.ttf'))
+@lru_cache(maxsize=None)
+def get_styles():
+    """Шрифт и стили регистрируются один раз на процесс."""
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
     styles = getSampleStyleSheet()
     styles.add(ParagraphStyle(
         name='Top Recipe',
-        fontName='CaviarDreams',
+        fontName=FONT_NAME,
         fontSize=15,
         leading=20,
         textColor=colors.black,
@@ -25,21 +36,59 @@ def generate_pdf_file(text, response):
     )
     styles.add(ParagraphStyle(
         name='Ingredient',
-        fontName='CaviarDreams',
+        fontName=FONT_NAME,
         fontSize=10,
         textColor=colors.black,
         alignment=TA_LEFT)
     )
     styles.add(ParagraphStyle(
         name='Info',
-        fontName='CaviarDreams',
+        fontName=FONT_NAME,
         fontSize=9,
         textColor=colors.silver,
         alignment=TA_LEFT)
     )
+    table_style = TableStyle((
+        ('FONTNAME', (0, 0), (-1, -1), FONT_NAME),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.silver),
+        ('LINEBELOW', (0, 0), (-1, 0), 0.5, colors.silver),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ))
+    return styles, table_style
+
+
+def iter_tables(items, table_style):
+    """Режет список на таблицы примерно по странице.
+
+    Одна длинная таблица при переносе каждый раз заново измеряет все
+    оставшиеся строки, из-за чего время растёт квадратично.
+    """
+    items = iter(items)
+    while True:
+        rows = [
+            (name, str(amount), measurement_unit)
+            for name, amount, measurement_unit
+            in islice(items, TABLE_CHUNK_SIZE)
+        ]
+        if not rows:
+            return
+        yield Table(
+            [TABLE_HEADER, *rows],
+            colWidths=TABLE_COL_WIDTHS,
+            repeatRows=1,
+            style=table_style
+        )
+
+
+def generate_pdf_file(items, output):
+    """Рисует список покупок в output.
 
+    items - тройки (название, количество, единица измерения).
+    """
+    styles, table_style = get_styles()
     pdf = SimpleDocTemplate(
-        response,
+        output,
         title='Список ингредиентов',
         pagesize=A4,
         rightMargin=2 * cm,
@@ -47,10 +96,9 @@ def generate_pdf_file(text, response):
         topMargin=2 * cm,
         bottomMargin=2 * cm
     )
-    pdf_generate = []
-    text_title = 'Ингредиенты:'
-    pdf_generate.append(Paragraph(text_title, styles['Top Recipe']))
-    pdf_generate.append(Spacer(1, 24))
-    pdf_generate.append(Paragraph(text, styles['Ingredient']))
-    pdf.build(pdf_generate)
-    return response
+    pdf.build([
+        Paragraph('Ингредиенты:', styles['Top Recipe']),
+        Spacer(1, 24),
+        *iter_tables(items, table_style),
+    ])
+    return output
@@ -0,0 +1,101 @@
+import base64
+import json
+import os
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.parsers import FastJSONParser, orjson
+from api.renderers import FastJSONRenderer
+from api.serializers import RecipeReadSerializer
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает JSONRenderer и JSONParser DRF с FastJSONRenderer '
+        'и FastJSONParser на рецептах из БД.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'sizes', nargs='*', type=int, default=[20, 100, 500]
+        )
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument(
+            '--image-size', type=int, default=512,
+            help='Размер картинки в запросе, КБ.'
+        )
+
+    def best_of(self, repeat, func):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def report(self, title, slow, fast):
+        self.stdout.write(
+            f'{title}: DRF {slow * 1000:.2f} мс, '
+            f'быстрый {fast * 1000:.2f} мс, ускорение {slow / fast:.1f}x'
+        )
+
+    def handle(self, sizes, repeat, image_size, **kwargs):
+        self.stdout.write(
+            f'orjson {orjson.__version__}' if orjson
+            else 'orjson не установлен, работает стандартный json'
+        )
+        request = Request(RequestFactory().get(
+            '/api/recipes/', HTTP_HOST='localhost'
+        ))
+        for size in sizes:
+            recipes = list(Recipe.objects.select_related('author')[:size])
+            if len(recipes) < size:
+                raise CommandError(f'В БД меньше {size} рецептов.')
+            data = RecipeReadSerializer(
+                recipes, many=True, context={'request': request}
+            ).data
+            rendered = JSONRenderer().render(data)
+            if FastJSONRenderer().render(data) != rendered:
+                raise CommandError(f'{size} рецептов: ответы различаются.')
+            self.report(
+                f'Ответ, {size} рецептов ({len(rendered)} Б)',
+                self.best_of(repeat, lambda: JSONRenderer().render(data)),
+                self.best_of(
+                    repeat, lambda: FastJSONRenderer().render(data)
+                ),
+            )
+        recipe = recipes[0]
+        encoded = base64.b64encode(os.urandom(image_size * 1024)).decode()
+        body = json.dumps({
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'tags': [tag.id for tag in recipe.tags.all()],
+            'ingredients': [
+                {'id': row.ingredient_id, 'amount': row.amount}
+                for row in recipe.recipe.all()
+            ],
+            'image': f'data:image/png;base64,{encoded}',
+        }, ensure_ascii=False).encode()
+        if (
+            FastJSONParser().parse(BytesIO(body))
+            != JSONParser().parse(BytesIO(body))
+        ):
+            raise CommandError('Разобранные запросы различаются.')
+        self.report(
+            f'Запрос с картинкой ({len(body)} Б)',
+            self.best_of(
+                repeat, lambda: JSONParser().parse(BytesIO(body))
+            ),
+            self.best_of(
+                repeat, lambda: FastJSONParser().parse(BytesIO(body))
+            ),
+        )
@@ -0,0 +1,36 @@
+import time
+import tracemalloc
+from tempfile import TemporaryFile
+
+from django.core.management.base import BaseCommand
+
+from api.generate_pdf_file import generate_pdf_file, get_styles
+
+
+class Command(BaseCommand):
+    help = 'Замеряет время и пиковую память генерации списка покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'sizes', nargs='*', type=int, default=[10, 100, 1000, 10000]
+        )
+
+    def handle(self, sizes, **kwargs):
+        get_styles()
+        for size in sizes:
+            items = (
+                (f'Ингредиент {number}', number, 'г')
+                for number in range(size)
+            )
+            tracemalloc.start()
+            started = time.perf_counter()
+            with TemporaryFile() as pdf:
+                generate_pdf_file(items, pdf)
+                pdf_size = pdf.tell()
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.stdout.write(
+                f'{size} строк: {elapsed:.3f} с, '
+                f'пик памяти {peak / 1024:.0f} КБ, файл {pdf_size} Б'
+            )
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.fast_serializers import build_fast_recipe_snapshots
+from api.serializers import build_recipe_snapshots
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает построение снимков рецептов через DRF '
+        'и быстрым путём на последних рецептах из БД.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'sizes', nargs='*', type=int, default=[20, 100, 500]
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, sizes, repeat, **kwargs):
+        request = Request(RequestFactory().get(
+            '/api/recipes/', HTTP_HOST='localhost'
+        ))
+        context = {'request': request}
+        builders = (
+            ('DRF', build_recipe_snapshots),
+            ('быстрый', build_fast_recipe_snapshots),
+        )
+        for size in sizes:
+            if Recipe.objects.count() < size:
+                raise CommandError(f'В БД меньше {size} рецептов.')
+            timings = {}
+            outputs = {}
+            for name, build in builders:
+                best = None
+                for _ in range(repeat):
+                    recipes = list(
+                        Recipe.objects.select_related('author')[:size]
+                    )
+                    started = time.perf_counter()
+                    snapshots = build(recipes, context)
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                timings[name] = best
+                outputs[name] = JSONRenderer().render(
+                    [snapshots[recipe.id] for recipe in recipes]
+                )
+            if outputs['DRF'] != outputs['быстрый']:
+                raise CommandError(f'{size} рецептов: ответы различаются.')
+            self.stdout.write(
+                f'{size} рецептов: DRF {timings["DRF"] * 1000:.1f} мс, '
+                f'быстрый {timings["быстрый"] * 1000:.1f} мс, '
+                f'ускорение {timings["DRF"] / timings["быстрый"]:.1f}x'
+            )
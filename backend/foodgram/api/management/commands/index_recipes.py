@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.search import index_recipe
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый поисковый индекс рецептов.'
+
+    def handle(self, **kwargs):
+        recipes = Recipe.objects.only('id', 'name', 'text')
+        for recipe in recipes.iterator():
+            index_recipe(recipe)
+        self.stdout.write(self.style.SUCCESS(
+            'Поисковый индекс рецептов пересобран.'
+        ))
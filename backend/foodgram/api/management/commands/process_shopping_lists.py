@@ -0,0 +1,44 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.pdf_cache import run_pdf_job, take_pdf_job
+from recipes.models import ShoppingListJob
+
+
+class Command(BaseCommand):
+    help = 'Формирует PDF списков покупок из очереди задач.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Разобрать очередь и завершиться.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Пауза между опросами пустой очереди, секунд.',
+        )
+
+    def handle(self, once, interval, **kwargs):
+        while True:
+            job = take_pdf_job()
+            if job is None:
+                ShoppingListJob.objects.filter(
+                    finished__lt=timezone.now() - timedelta(
+                        seconds=settings.SHOPPING_LIST_JOB_TTL
+                    )
+                ).delete()
+                if once:
+                    return
+                time.sleep(interval)
+                continue
+            try:
+                run_pdf_job(job)
+            except Exception as error:
+                self.stderr.write(f'Задача {job.id} не выполнена: {error}')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from api.shopping_list import rebuild_shopping_lists
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает итоги списков покупок по рецептам в корзинах.'
+
+    def handle(self, **kwargs):
+        rebuild_shopping_lists()
+        self.stdout.write(self.style.SUCCESS(
+            'Итоги списков покупок пересобраны.'
+        ))
@@ -1,5 +1,28 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class CustomPagination(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class PubDateCursorPagination(CursorPagination):
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+
+
+class CursorPaginationMixin:
+    """Keyset-пагинация по запросу (?cursor=), иначе page/limit."""
+    cursor_pagination_class = PubDateCursorPagination
+    cursor_pagination_actions = ('list',)
+
+    @property
+    def paginator(self):
+        if (
+            not hasattr(self, '_paginator')
+            and self.action in self.cursor_pagination_actions
+            and self.cursor_pagination_class.cursor_query_param
+            in self.request.query_params
+        ):
+            self._paginator = self.cursor_pagination_class()
+        return super().paginator
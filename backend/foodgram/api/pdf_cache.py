@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+from datetime import timedelta
+from tempfile import NamedTemporaryFile
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from recipes.models import ShoppingListJob
+from .generate_pdf_file import generate_pdf_file
+
+# Меняется вместе с оформлением PDF, чтобы не отдавать старые файлы.
+PDF_CACHE_VERSION = 1
+
+
+def get_pdf_key(items):
+    content = json.dumps(
+        [PDF_CACHE_VERSION, items], ensure_ascii=False
+    ).encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+
+def evict_pdf_cache(directory, max_size, keep=None):
+    """Удаляет давно не запрошенные файлы, пока кэш больше max_size.
+
+    Время последнего запроса хранится в mtime файла, keep не удаляется.
+    """
+    files = []
+    total = 0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.name.endswith('.pdf'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            total += stat.st_size
+            if entry.path != keep:
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+    files.sort()
+    for _, size, path in files:
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def get_pdf_path(key):
+    return os.path.join(settings.SHOPPING_LIST_CACHE_DIR, f'{key}.pdf')
+
+
+def touch_cached_pdf(path):
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def get_cached_pdf(items):
+    """Возвращает путь к PDF для списка (название, количество, единица).
+
+    Файл ищется по хэшу содержимого списка, reportlab вызывается только
+    при промахе.
+    """
+    items = [list(item) for item in items]
+    directory = settings.SHOPPING_LIST_CACHE_DIR
+    path = get_pdf_path(get_pdf_key(items))
+    if touch_cached_pdf(path):
+        return path
+    os.makedirs(directory, exist_ok=True)
+    pdf = NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False)
+    try:
+        with pdf:
+            generate_pdf_file(items, pdf)
+        os.replace(pdf.name, path)
+    except BaseException:
+        os.remove(pdf.name)
+        raise
+    evict_pdf_cache(directory, settings.SHOPPING_LIST_CACHE_SIZE, path)
+    return path
+
+
+def enqueue_pdf_job(user, items, key):
+    job = ShoppingListJob.objects.filter(
+        user=user,
+        key=key,
+        status__in=(
+            ShoppingListJob.Status.PENDING, ShoppingListJob.Status.RUNNING
+        )
+    ).first()
+    if job is None:
+        job = ShoppingListJob.objects.create(user=user, key=key, items=items)
+    return job
+
+
+def take_pdf_job():
+    """Забирает из очереди самую старую задачу.
+
+    Строки, заблокированные другими обработчиками, пропускаются.
+    Задачи, которые формируются дольше SHOPPING_LIST_JOB_TIMEOUT,
+    считаются брошенными и забираются заново.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.SHOPPING_LIST_JOB_TIMEOUT)
+    with transaction.atomic():
+        job = ShoppingListJob.objects.select_for_update(
+            skip_locked=True
+        ).filter(
+            Q(status=ShoppingListJob.Status.PENDING)
+            | Q(status=ShoppingListJob.Status.RUNNING, started__lt=stale)
+        ).first()
+        if job is not None:
+            job.status = ShoppingListJob.Status.RUNNING
+            job.started = now
+            job.save(update_fields=('status', 'started'))
+    return job
+
+
+def run_pdf_job(job):
+    try:
+        get_cached_pdf(job.items)
+    except Exception:
+        job.status = ShoppingListJob.Status.FAILED
+        raise
+    else:
+        job.status = ShoppingListJob.Status.DONE
+    finally:
+        job.finished = timezone.now()
+        job.save(update_fields=('status', 'finished'))
@@ -0,0 +1,365 @@
+import heapq
+import math
+import re
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict, namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import (Avg, Case, Count, FloatField, OuterRef, Subquery,
+                              Sum, Value, When)
+from django.db.models.functions import Cast
+from snowballstemmer import stemmer
+
+from recipes.models import (Ingredient, IngredientInRecipe, Recipe,
+                            RecipeSearchTerm)
+from .cache import (MODEL_VERSION_KEY, PANTRY_VERSION_KEY, SEARCH_STATS_KEY,
+                    SEARCH_VERSION_KEY, bump_search_version, get_recipe_cache,
+                    get_versions)
+
+FUZZY_THRESHOLD = 0.3
+FUZZY_LIMIT = 10
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+STOP_WORDS = frozenset((
+    'а', 'без', 'в', 'во', 'да', 'для', 'до', 'же', 'за', 'и', 'из', 'или',
+    'к', 'как', 'ко', 'на', 'не', 'но', 'о', 'об', 'от', 'по', 'при', 'с',
+    'со', 'то', 'у', 'что',
+))
+russian_stemmer = stemmer('russian')
+
+PANTRY_MIN_COVERAGE = 0.5
+PANTRY_LIMIT = 500
+
+
+def normalize(text):
+    return text.casefold().replace('ё', 'е').strip()
+
+
+def trigrams(text):
+    """Триграммы слов строки, как их считает pg_trgm."""
+    result = set()
+    for word in re.findall(r'\w+', normalize(text)):
+        word = f'  {word} '
+        result.update(word[i:i + 3] for i in range(len(word) - 2))
+    return result
+
+
+@lru_cache(maxsize=None)
+def has_pg_trgm():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+IngredientSnapshot = namedtuple(
+    'IngredientSnapshot', ('keys', 'rows', 'grams', 'gram_counts')
+)
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Хранит отсортированные нормализованные названия и готовые строки
+    ответа. Перестраивается, когда меняется версия модели Ingredient.
+    Новый снимок подменяет старый одним присваиванием, поэтому поиск
+    в другом потоке видит либо старый индекс, либо новый целиком.
+    """
+    fields = ('id', 'name', 'measurement_unit')
+
+    def __init__(self):
+        self.version = None
+        self.snapshot = IngredientSnapshot((), (), {}, ())
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        version, = get_versions(
+            MODEL_VERSION_KEY.format(Ingredient._meta.label_lower)
+        )
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.snapshot = self.build()
+                    self.version = version
+        return self.snapshot
+
+    def build(self):
+        rows = sorted(
+            Ingredient.objects.values(*self.fields),
+            key=lambda row: (normalize(row['name']), row['id'])
+        )
+        grams = defaultdict(list)
+        gram_counts = []
+        for position, row in enumerate(rows):
+            row_grams = trigrams(row['name'])
+            gram_counts.append(len(row_grams))
+            for gram in row_grams:
+                grams[gram].append(position)
+        return IngredientSnapshot(
+            keys=tuple(normalize(row['name']) for row in rows),
+            rows=tuple(rows),
+            grams={gram: tuple(items) for gram, items in grams.items()},
+            gram_counts=tuple(gram_counts),
+        )
+
+    def search(self, query, limit=None):
+        """Сначала точное совпадение, затем по префиксу, затем подстрока."""
+        keys, rows, _, _ = self.refresh()
+        query = normalize(query)
+        if not query:
+            return list(rows[:limit])
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + '\U0010ffff', start)
+        found = list(rows[start:end])
+        if limit is None or len(found) < limit:
+            found += [
+                row for key, row in zip(keys, rows)
+                if query in key and not key.startswith(query)
+            ]
+        return found[:limit]
+
+    def fuzzy_search(self, query, limit=FUZZY_LIMIT):
+        """Похожие по триграммам названия, по убыванию сходства."""
+        _, rows, grams, gram_counts = self.refresh()
+        query_grams = trigrams(query)
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for position in grams.get(gram, ()):
+                shared[position] += 1
+        scored = (
+            (count / (len(query_grams) + gram_counts[position] - count),
+             position)
+            for position, count in shared.items()
+        )
+        best = heapq.nlargest(
+            limit,
+            (item for item in scored if item[0] >= FUZZY_THRESHOLD),
+            key=lambda item: (item[0], -item[1])
+        )
+        return [
+            {**rows[position], 'similarity': round(score, 3)}
+            for score, position in best
+        ]
+
+
+ingredient_index = IngredientIndex()
+
+
+def warm_up_ingredient_index():
+    """Строит индекс при запуске воркера, а не на первом запросе."""
+    try:
+        ingredient_index.refresh()
+    except DatabaseError:
+        # БД ещё недоступна или без миграций: индекс соберёт первый запрос.
+        pass
+
+
+def fuzzy_search_ingredients(query, limit=FUZZY_LIMIT):
+    """Нечёткий поиск: pg_trgm, если доступен, иначе индекс в памяти."""
+    if not has_pg_trgm():
+        return ingredient_index.fuzzy_search(query, limit)
+    from django.contrib.postgres.search import TrigramSimilarity
+    # Оператор % (pg_trgm.similarity_threshold, по умолчанию 0.3) отбирает
+    # строки по GIN-индексу, similarity() считается только для них.
+    rows = Ingredient.objects.filter(
+        name__trigram_similar=query
+    ).annotate(
+        similarity=TrigramSimilarity('name', query)
+    ).filter(
+        similarity__gte=FUZZY_THRESHOLD
+    ).order_by('-similarity', 'name').values(
+        *IngredientIndex.fields, 'similarity'
+    )[:limit]
+    return [
+        {**row, 'similarity': round(row['similarity'], 3)} for row in rows
+    ]
+
+
+class PantryIndex:
+    """Обратный индекс ингредиент -> рецепты для подбора по кладовой.
+
+    Для каждого ингредиента хранит отсортированный массив id рецептов.
+    Изменения рецептов этого процесса вносятся на месте; если версию
+    в общем кэше поднял другой процесс, индекс строится заново.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.recipes = {}
+        self.ingredients = {}
+        self.lock = threading.RLock()
+
+    def refresh(self):
+        version, = get_versions(PANTRY_VERSION_KEY)
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            self.build()
+            self.version = version
+
+    def build(self):
+        recipes = defaultdict(lambda: array('Q'))
+        ingredients = defaultdict(list)
+        rows = IngredientInRecipe.objects.order_by('recipe_id').values_list(
+            'recipe_id', 'ingredient_id'
+        )
+        for recipe_id, ingredient_id in rows.iterator():
+            recipes[ingredient_id].append(recipe_id)
+            ingredients[recipe_id].append(ingredient_id)
+        self.recipes = dict(recipes)
+        self.ingredients = {
+            recipe_id: tuple(ids) for recipe_id, ids in ingredients.items()
+        }
+
+    def update_recipe(self, recipe_id, ingredient_ids=()):
+        """Заменяет набор ингредиентов рецепта; пустой набор удаляет его.
+
+        Изменение вносится после коммита текущей транзакции: иначе другой
+        процесс по новой версии построил бы индекс из незакоммиченных
+        данных, а после отката здесь остался бы несуществующий рецепт.
+        """
+        ingredient_ids = tuple(set(ingredient_ids))
+        transaction.on_commit(
+            lambda: self.apply_update(recipe_id, ingredient_ids)
+        )
+
+    def apply_update(self, recipe_id, ingredient_ids):
+        with self.lock:
+            if self.version is not None:
+                for ingredient_id in self.ingredients.pop(recipe_id, ()):
+                    postings = self.recipes[ingredient_id]
+                    postings.pop(bisect_left(postings, recipe_id))
+                for ingredient_id in ingredient_ids:
+                    insort(
+                        self.recipes.setdefault(ingredient_id, array('Q')),
+                        recipe_id
+                    )
+                if ingredient_ids:
+                    self.ingredients[recipe_id] = ingredient_ids
+            self.bump_version()
+
+    def bump_version(self):
+        cache = get_recipe_cache()
+        try:
+            version = cache.incr(PANTRY_VERSION_KEY)
+        except ValueError:
+            version = None
+        if self.version is None or version != self.version + 1:
+            self.version = None
+        else:
+            self.version = version
+
+    def match(self, ingredient_ids, min_coverage=PANTRY_MIN_COVERAGE,
+              limit=PANTRY_LIMIT):
+        """Пары (доля покрытия, id рецепта), лучшие покрытия первыми."""
+        self.refresh()
+        recipes, ingredients = self.recipes, self.ingredients
+        counts = Counter()
+        for ingredient_id in set(ingredient_ids):
+            counts.update(recipes.get(ingredient_id, ()))
+        scored = (
+            (count / len(ingredients.get(recipe_id) or (None,)), recipe_id)
+            for recipe_id, count in counts.items()
+        )
+        return heapq.nlargest(
+            limit, (item for item in scored if item[0] >= min_coverage)
+        )
+
+
+pantry_index = PantryIndex()
+
+
+def analyze(text):
+    """Основы слов текста для полнотекстового индекса рецептов."""
+    words = [
+        word for word in re.findall(r'\w+', normalize(text))
+        if word not in STOP_WORDS
+    ]
+    max_length = RecipeSearchTerm._meta.get_field('term').max_length
+    return [term[:max_length] for term in russian_stemmer.stemWords(words)]
+
+
+def index_recipe(recipe):
+    """Пересобирает термины одного рецепта в поисковом индексе."""
+    terms = Counter(analyze(f'{recipe.name} {recipe.text}'))
+    with transaction.atomic():
+        RecipeSearchTerm.objects.filter(recipe=recipe).delete()
+        RecipeSearchTerm.objects.bulk_create(
+            RecipeSearchTerm(
+                recipe=recipe,
+                term=term,
+                frequency=min(frequency, 32767)
+            )
+            for term, frequency in terms.items()
+        )
+        Recipe.objects.filter(id=recipe.id).update(
+            search_length=sum(terms.values())
+        )
+        transaction.on_commit(bump_search_version)
+
+
+def get_search_stats():
+    """Число рецептов и средняя длина документа для BM25.
+
+    Считаются один раз на версию поискового индекса, а не на каждый
+    запрос: агрегат по всей таблице рецептов слишком дорог.
+    """
+    version, = get_versions(SEARCH_VERSION_KEY)
+    key = SEARCH_STATS_KEY.format(version)
+    cache = get_recipe_cache()
+    stats = cache.get(key)
+    if stats is None:
+        stats = Recipe.objects.aggregate(
+            total=Count('id'), avg_length=Avg('search_length')
+        )
+        cache.set(key, stats, settings.RECIPES_CACHE_TIMEOUT)
+    return stats
+
+
+def rank_recipes(queryset, query):
+    """Рецепты, подходящие под запрос, по убыванию оценки BM25."""
+    terms = set(analyze(query))
+    document_frequency = dict(
+        RecipeSearchTerm.objects.filter(term__in=terms).values(
+            'term'
+        ).annotate(total=Count('id')).values_list('term', 'total')
+    )
+    if not document_frequency:
+        return queryset.none()
+    stats = get_search_stats()
+    weight = Case(
+        *(
+            When(term=term, then=Value(math.log(
+                1 + (stats['total'] - total + 0.5) / (total + 0.5)
+            )))
+            for term, total in document_frequency.items()
+        ),
+        output_field=FloatField()
+    )
+    frequency = Cast('frequency', FloatField())
+    length = Cast('recipe__search_length', FloatField())
+    saturation = Value(BM25_K1 * (1 - BM25_B)) + Value(
+        BM25_K1 * BM25_B / (stats['avg_length'] or 1)
+    ) * length
+    score = RecipeSearchTerm.objects.filter(
+        recipe=OuterRef('pk'), term__in=document_frequency
+    ).order_by().values('recipe').annotate(
+        score=Sum(
+            weight * frequency * Value(BM25_K1 + 1) / (frequency + saturation)
+        )
+    ).values('score')
+    return queryset.filter(
+        id__in=RecipeSearchTerm.objects.filter(
+            term__in=document_frequency
+        ).values('recipe')
+    ).annotate(
+        search_rank=Subquery(score, output_field=FloatField())
+    ).order_by('-search_rank', '-pub_date', '-id')
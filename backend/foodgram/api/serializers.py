@@ -1,9 +1,30 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.db import transaction
+from django.db.models import F, Prefetch, Window, prefetch_related_objects
+from django.db.models.functions import RowNumber
 from drf_base64.fields import Base64ImageField
 from rest_framework import serializers
 
-from recipes.models import (Ingredient, IngredientInRecipe, Recipe, Subscribe,
-                            Tag)
+from recipes.models import (FeedEntry, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCartIngredient, Subscribe, Tag)
 from users.models import User
+from .cache import bump_recipe_version, get_recipe_cache, get_snapshot_keys
+from .search import pantry_index
+from .shopping_list import (apply_cart_deltas, get_amounts_diff,
+                            get_cart_user_ids)
+
+BATCH_SIZE = 100
+
+RECIPE_PREFETCH = {
+    'tags': 'tags',
+    'ingredients': Prefetch(
+        'recipe',
+        queryset=IngredientInRecipe.objects.select_related('ingredient')
+    ),
+}
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -17,6 +38,8 @@ class UserSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'followed'):
+            return obj.followed
         user = self.context.get('request').user
         if not user.is_authenticated:
             return False
@@ -99,6 +122,81 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         return data
 
 
+class ShoppingCartIngredientSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
+
+    class Meta:
+        model = ShoppingCartIngredient
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
+def get_recipe_snapshots(recipes, context):
+    """Не зависящие от пользователя представления рецептов из кэша.
+
+    Недостающие снимки строятся одним вызовом context['snapshot_builder']
+    (по умолчанию build_recipe_snapshots) и сохраняются до следующего
+    изменения рецепта, но не дольше RECIPE_SNAPSHOT_TIMEOUT. Если
+    запрошена часть полей (context['fields']), подходит и полный снимок,
+    а недостающие строятся и кэшируются только из нужных полей.
+    """
+    fields = context.get('fields')
+    cache = get_recipe_cache()
+    keys = get_snapshot_keys(
+        [recipe.id for recipe in recipes],
+        context['request'].get_host()
+    )
+    if fields is None:
+        partial_keys = keys
+    else:
+        suffix = f':{get_fields_mask(fields)}'
+        partial_keys = {pk: key + suffix for pk, key in keys.items()}
+    cached = cache.get_many({*keys.values(), *partial_keys.values()})
+    snapshots = {}
+    for pk, key in keys.items():
+        if key in cached:
+            snapshots[pk] = cached[key]
+        elif partial_keys[pk] in cached:
+            snapshots[pk] = cached[partial_keys[pk]]
+    missing = [recipe for recipe in recipes if recipe.id not in snapshots]
+    if missing:
+        build = context.get('snapshot_builder', build_recipe_snapshots)
+        built = build(missing, context)
+        cache.set_many(
+            {partial_keys[pk]: snapshot for pk, snapshot in built.items()},
+            settings.RECIPE_SNAPSHOT_TIMEOUT if fields is None
+            else settings.RECIPES_CACHE_TIMEOUT
+        )
+        snapshots.update(built)
+    return snapshots
+
+
+def build_recipe_snapshots(recipes, context):
+    """Снимки рецептов через RecipeSnapshotSerializer."""
+    fields = context.get('fields')
+    prefetch_related_objects(recipes, *(
+        lookup for name, lookup in RECIPE_PREFETCH.items()
+        if fields is None or name in fields
+    ))
+    return {
+        recipe.id: dict(RecipeSnapshotSerializer(recipe, context=context).data)
+        for recipe in recipes
+    }
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        recipes = list(data.all() if hasattr(data, 'all') else data)
+        snapshots = get_recipe_snapshots(recipes, self.context)
+        return [
+            self.child.apply_overlay(snapshots[recipe.id], recipe)
+            for recipe in recipes
+        ]
+
+
 class RecipeReadSerializer(serializers.ModelSerializer):
     author = UserSerializer(
         many=False,
@@ -126,21 +224,107 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'tags', 'name', 'author', 'ingredients', 'image', 'text',
             'cooking_time', 'is_favorited', 'is_in_shopping_cart',
+            'favorites_count', 'shopping_cart_count',
         )
+        list_serializer_class = RecipeListSerializer
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+    def to_representation(self, recipe):
+        snapshot = get_recipe_snapshots([recipe], self.context)[recipe.id]
+        return self.apply_overlay(snapshot, recipe)
+
+    def apply_overlay(self, snapshot, recipe):
+        data = {name: snapshot[name] for name in self.fields}
+        if 'author' in data:
+            data['author']['is_subscribed'] = self.get_author_is_subscribed(
+                recipe
+            )
+        if 'is_favorited' in data:
+            data['is_favorited'] = self.get_is_favorited(recipe)
+        if 'is_in_shopping_cart' in data:
+            data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(
+                recipe
+            )
+        return data
+
+    def get_author_is_subscribed(self, recipe):
+        if hasattr(recipe, 'author_subscribed'):
+            return recipe.author_subscribed
+        user = self.context.get('request').user
+        if user.is_anonymous:
+            return False
+        return user.subscriber.filter(author_id=recipe.author_id).exists()
 
     def get_is_favorited(self, recipe):
+        if hasattr(recipe, 'favorited'):
+            return recipe.favorited
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
         return recipe.is_favorited.filter(author=user).exists()
 
     def get_is_in_shopping_cart(self, recipe):
+        if hasattr(recipe, 'in_shopping_cart'):
+            return recipe.in_shopping_cart
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
         return recipe.is_in_shopping_cart.filter(author=user).exists()
 
 
+def get_recipe_fields(query_params):
+    """Поля рецепта из ?fields= и ?omit=; None - все поля."""
+    fields = query_params.get('fields')
+    omit = query_params.get('omit')
+    if not fields and not omit:
+        return None
+    names = set(RecipeReadSerializer.Meta.fields)
+    if fields:
+        names &= set(fields.split(','))
+    if omit:
+        names -= set(omit.split(','))
+    names.add('id')
+    return frozenset(names)
+
+
+def get_fields_mask(fields):
+    return sum(
+        1 << number
+        for number, name in enumerate(RecipeReadSerializer.Meta.fields)
+        if name in fields
+    )
+
+
+class SnapshotUserSerializer(UserSerializer):
+    def get_is_subscribed(self, obj):
+        return False
+
+
+class RecipeSnapshotSerializer(RecipeReadSerializer):
+    author = SnapshotUserSerializer(
+        many=False,
+        read_only=True
+    )
+
+    class Meta(RecipeReadSerializer.Meta):
+        list_serializer_class = serializers.ListSerializer
+
+    def to_representation(self, recipe):
+        return serializers.ModelSerializer.to_representation(self, recipe)
+
+    def get_is_favorited(self, recipe):
+        return False
+
+    def get_is_in_shopping_cart(self, recipe):
+        return False
+
+
 class RecipeCreateSerializer(serializers.ModelSerializer):
     ingredients = IngredientInRecipeSerializer(
         many=True,
@@ -177,24 +361,37 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Добавьте хотя бы один ингредиент.'
             )
-        ingredient_list = []
+        amounts = {}
         for ingredient in ingredients:
-            ingredient_id = ingredient['id']
-            if ingredient_id in ingredient_list:
+            try:
+                ingredient_id = int(ingredient['id'])
+            except (KeyError, TypeError, ValueError):
+                raise serializers.ValidationError(
+                    'Укажите id ингредиента.'
+                )
+            if ingredient_id in amounts:
                 raise serializers.ValidationError(
                     'Ингредиент должен быть уникальным!'
                 )
-            ingredient_list.append(ingredient_id)
             try:
-                int(ingredient['amount'])
-            except ValueError:
+                amounts[ingredient_id] = int(ingredient['amount'])
+            except (KeyError, TypeError, ValueError):
                 raise serializers.ValidationError(
                     'Кол-во ингредиентов должно быть указано только цифрами.'
                 )
-            if int(ingredient['amount']) <= 0:
+            if amounts[ingredient_id] <= 0:
                 raise serializers.ValidationError(
                     'Укажите количество ингредиентов'
                 )
+        missing = amounts.keys() - set(Ingredient.objects.filter(
+            id__in=amounts
+        ).values_list('id', flat=True))
+        if missing:
+            raise serializers.ValidationError(
+                'Ингредиенты не найдены: '
+                + ', '.join(str(pk) for pk in sorted(missing))
+            )
+        data['ingredients'] = amounts
         return data
 
     def validate_name(self, name):
@@ -233,35 +430,91 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             )
         return cooking_time
 
-    def create_ingredients(self, ingredients, recipe):
-        for ingredient in ingredients:
+    def create_ingredients(self, amounts, recipe):
+        IngredientInRecipe.objects.bulk_create(
             IngredientInRecipe(
-                recipe=recipe,
-                ingredient_id=ingredient['id'],
-                amount=ingredient.get('amount')
-            ).save()
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+        )
+
+    def update_ingredients(self, amounts, recipe):
+        """Меняет только отличающиеся строки состава рецепта.
+
+        Возвращает прежний состав {ингредиент: количество}.
+        """
+        old_amounts = defaultdict(int)
+        rows = {}
+        stale = []
+        for row in IngredientInRecipe.objects.filter(recipe=recipe):
+            old_amounts[row.ingredient_id] += row.amount
+            if row.ingredient_id in rows or row.ingredient_id not in amounts:
+                stale.append(row.id)
+            else:
+                rows[row.ingredient_id] = row
+        changed = []
+        for ingredient_id, row in rows.items():
+            if row.amount != amounts[ingredient_id]:
+                row.amount = amounts[ingredient_id]
+                changed.append(row)
+        if stale:
+            IngredientInRecipe.objects.filter(id__in=stale).delete()
+        if changed:
+            IngredientInRecipe.objects.bulk_update(changed, ('amount',))
+        self.create_ingredients(
+            {
+                ingredient_id: amount
+                for ingredient_id, amount in amounts.items()
+                if ingredient_id not in rows
+            },
+            recipe
+        )
+        return old_amounts
 
+    @transaction.atomic
     def create(self, validated_data):
-        ingredients = self.initial_data.get('ingredients')
+        amounts = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(
             author=self.context['request'].user,
             **validated_data
         )
         recipe.tags.set(tags)
-        self.create_ingredients(ingredients, recipe)
+        self.create_ingredients(amounts, recipe)
+        pantry_index.update_recipe(recipe.id, amounts)
+        FeedEntry.objects.bulk_create(
+            (
+                FeedEntry(user_id=user_id, recipe=recipe,
+                          pub_date=recipe.pub_date)
+                for user_id in recipe.author.subscribed.values_list(
+                    'user_id', flat=True
+                )
+            ),
+            batch_size=1000
+        )
+        self.bump_on_commit(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
-        recipe.ingredients.clear()
-        recipe.tags.clear()
-        ingredients = self.initial_data.get('ingredients')
-        tags = validated_data.pop('tags')
-        recipe.tags.set(tags)
-        IngredientInRecipe.objects.filter(recipe=recipe).all().delete()
-        self.create_ingredients(ingredients, recipe)
+        amounts = validated_data.pop('ingredients')
+        recipe.tags.set(validated_data.pop('tags'))
+        old_amounts = self.update_ingredients(amounts, recipe)
+        deltas = get_amounts_diff(old_amounts, amounts)
+        if any(deltas.values()):
+            apply_cart_deltas(get_cart_user_ids(recipe.id), deltas)
+        if old_amounts.keys() != amounts.keys():
+            pantry_index.update_recipe(recipe.id, amounts)
+        self.bump_on_commit(recipe)
         return super().update(recipe, validated_data)
 
+    def bump_on_commit(self, recipe):
+        # bulk-операции не вызывают сигналы IngredientInRecipe,
+        # а сброс до коммита позволил бы закэшировать старые данные.
+        transaction.on_commit(
+            lambda: bump_recipe_version(recipe.author_id, (recipe.id,))
+        )
+
     def to_representation(self, instance):
         data = RecipeReadSerializer(
             instance,
@@ -278,7 +531,57 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
+class BatchSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BATCH_SIZE,
+    )
+
+    def validate_ids(self, ids):
+        return list(dict.fromkeys(ids))
+
+
+def get_latest_recipes(author_ids, limit):
+    """Последние limit рецептов каждого автора одним оконным запросом."""
+    latest = defaultdict(list)
+    if not author_ids:
+        return latest
+    ranked = Recipe.objects.filter(author_id__in=author_ids).annotate(
+        row_number=Window(
+            expression=RowNumber(),
+            partition_by=F('author_id'),
+            order_by=(F('pub_date').desc(), F('id').desc())
+        )
+    ).order_by()
+    try:
+        sql, params = ranked.query.sql_with_params()
+    except EmptyResultSet:
+        return latest
+    recipes = Recipe.objects.raw(
+        f'SELECT * FROM ({sql}) ranked WHERE row_number <= %s '
+        f'ORDER BY author_id, row_number',
+        (*params, limit)
+    )
+    for recipe in recipes:
+        latest[recipe.author_id].append(recipe)
+    return latest
+
+
+class SubscribeListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        subscriptions = list(data.all() if hasattr(data, 'all') else data)
+        self.context['latest_recipes'] = get_latest_recipes(
+            [subscription.author_id for subscription in subscriptions],
+            self.child.get_recipes_limit()
+        )
+        return super().to_representation(subscriptions)
+
+
 class SubscribeSerializer(UserSerializer):
+    email = serializers.ReadOnlyField(
+        source='author.email'
+    )
     id = serializers.ReadOnlyField(
         source='author.id'
     )
@@ -293,13 +596,15 @@ class SubscribeSerializer(UserSerializer):
     )
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
+    recipes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = (
-            'id', 'username', 'first_name', 'last_name',
-            'is_subscribed', 'recipes',
+            'email', 'id', 'username', 'first_name', 'last_name',
+            'is_subscribed', 'recipes', 'recipes_count',
         )
+        list_serializer_class = SubscribeListSerializer
 
     def validate(self, attrs):
         user = self.initial_data.get('user')
@@ -321,12 +626,24 @@ class SubscribeSerializer(UserSerializer):
                 )
         return attrs
 
+    def get_recipes_limit(self):
+        limit = self.context.get('request').query_params.get('recipes_limit')
+        if not limit:
+            limit = 3
+        return int(limit)
+
     def get_is_subscribed(self, username):
         return True
 
     def get_recipes(self, data):
-        limit = self.context.get('request').query_params.get('recipes_limit')
-        if not limit:
-            limit = 3
-        recipes = data.author.recipe.all()[:int(limit)]
+        latest_recipes = self.context.get('latest_recipes')
+        if latest_recipes is not None:
+            recipes = latest_recipes[data.author_id]
+        else:
+            recipes = data.author.recipe.all()[:self.get_recipes_limit()]
         return ShortRecipeSerializer(recipes, many=True).data
+
+    def get_recipes_count(self, data):
+        if hasattr(data, 'recipes_count'):
+            return data.recipes_count
+        return data.author.recipe.count()
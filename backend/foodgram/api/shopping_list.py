@@ -0,0 +1,146 @@
+import csv
+import json
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import (Case, F, IntegerField, Sum, Value,
+                              When)
+
+from recipes.models import (IngredientInRecipe, ShoppingCart,
+                            ShoppingCartIngredient)
+from users.models import User
+
+SHOPPING_LIST_FIELDS = ('name', 'amount', 'measurement_unit')
+
+
+def get_recipe_amounts(*recipe_ids):
+    amounts = defaultdict(int)
+    for ingredient_id, amount in IngredientInRecipe.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('ingredient_id', 'amount'):
+        amounts[ingredient_id] += amount
+    return amounts
+
+
+def get_amounts_diff(old, new):
+    return {
+        ingredient_id: new.get(ingredient_id, 0) - old.get(ingredient_id, 0)
+        for ingredient_id in old.keys() | new.keys()
+    }
+
+
+def get_cart_user_ids(recipe_id):
+    return ShoppingCart.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('author_id', flat=True)
+
+
+def apply_cart_deltas(user_ids, deltas):
+    """Прибавляет deltas {ингредиент: количество} к итогам списков покупок.
+
+    Строки пользователей блокируются, чтобы параллельные добавления
+    в один список не потеряли слагаемые.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    with transaction.atomic():
+        user_ids = list(User.objects.select_for_update().filter(
+            id__in=user_ids
+        ).order_by('id').values_list('id', flat=True))
+        if not user_ids:
+            return
+        totals = ShoppingCartIngredient.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=deltas
+        )
+        existing = set(totals.values_list('user_id', 'ingredient_id'))
+        totals.update(amount=F('amount') + Case(
+            *(
+                When(ingredient_id=pk, then=Value(delta))
+                for pk, delta in deltas.items()
+            ),
+            default=Value(0),
+            output_field=IntegerField()
+        ))
+        ShoppingCartIngredient.objects.bulk_create(
+            (
+                ShoppingCartIngredient(
+                    user_id=user_id, ingredient_id=pk, amount=delta
+                )
+                for user_id in user_ids
+                for pk, delta in deltas.items()
+                if delta > 0 and (user_id, pk) not in existing
+            ),
+            batch_size=1000
+        )
+        totals.filter(amount__lte=0).delete()
+
+
+def add_to_shopping_list(user_id, *recipe_ids):
+    apply_cart_deltas((user_id,), get_recipe_amounts(*recipe_ids))
+
+
+def remove_from_shopping_list(user_id, *recipe_ids):
+    apply_cart_deltas((user_id,), {
+        pk: -amount for pk, amount in get_recipe_amounts(*recipe_ids).items()
+    })
+
+
+def rebuild_shopping_lists():
+    with transaction.atomic():
+        ShoppingCartIngredient.objects.all().delete()
+        ShoppingCartIngredient.objects.bulk_create(
+            (
+                ShoppingCartIngredient(
+                    user_id=user_id, ingredient_id=ingredient_id,
+                    amount=amount
+                )
+                for user_id, ingredient_id, amount in IngredientInRecipe
+                .objects.filter(
+                    recipe__is_in_shopping_cart__isnull=False
+                ).values(
+                    'recipe__is_in_shopping_cart__author', 'ingredient'
+                ).annotate(total=Sum('amount')).values_list(
+                    'recipe__is_in_shopping_cart__author', 'ingredient',
+                    'total'
+                )
+            ),
+            batch_size=1000
+        )
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def iter_txt(items):
+    for name, amount, measurement_unit in items:
+        yield f'{name} - {amount} {measurement_unit}\n'
+
+
+def iter_csv(items):
+    writer = csv.writer(Echo())
+    yield writer.writerow(SHOPPING_LIST_FIELDS)
+    for item in items:
+        yield writer.writerow(item)
+
+
+def iter_json(items):
+    separator = ''
+    yield '['
+    for item in items:
+        yield separator + json.dumps(
+            dict(zip(SHOPPING_LIST_FIELDS, item)), ensure_ascii=False
+        )
+        separator = ','
+    yield ']'
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': iter_txt,
+    'csv': iter_csv,
+    'json': iter_json,
+}
@@ -0,0 +1,118 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from recipes.models import (Ingredient, IngredientInRecipe, Recipe, Tag,
+                            get_tag_keys)
+from users.models import User
+from .cache import (bump_recipe_version, bump_search_version,
+                    bump_shared_version)
+from .search import index_recipe, pantry_index
+from .shopping_list import (apply_cart_deltas, get_cart_user_ids,
+                            get_recipe_amounts)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    bump_recipe_version(instance.author_id, (instance.id,))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'name', 'text'} & set(update_fields):
+        index_recipe(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    pantry_index.update_recipe(instance.id)
+    transaction.on_commit(bump_search_version)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_removed_from_carts(sender, instance, **kwargs):
+    apply_cart_deltas(get_cart_user_ids(instance.id), {
+        pk: -amount for pk, amount in get_recipe_amounts(instance.id).items()
+    })
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    author_id = Recipe.objects.filter(
+        id=instance.recipe_id
+    ).values_list('author_id', flat=True).first()
+    bump_recipe_version(author_id, (instance.recipe_id,))
+
+
+def update_tag_keys(recipe_ids):
+    """Пересчитывает ключи тегов рецептов, возвращает {id рецепта: ключи}."""
+    tag_ids = defaultdict(list)
+    for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'tag_id'):
+        tag_ids[recipe_id].append(tag_id)
+    keys = {pk: get_tag_keys(tag_ids[pk]) for pk in recipe_ids}
+    Recipe.objects.bulk_update(
+        [Recipe(id=pk, tag_keys=value) for pk, value in keys.items()],
+        ['tag_keys']
+    )
+    return keys
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tag_keys_changed(sender, instance, action, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if isinstance(instance, Recipe):
+        # Экземпляр может потом сохраниться целиком, ключи в нём
+        # должны совпадать с записанными.
+        instance.tag_keys = update_tag_keys([instance.id])[instance.id]
+        return
+    if pk_set:
+        recipe_ids = list(pk_set)
+    else:
+        recipe_ids = list(Recipe.objects.filter(
+            tag_keys__has_key=next(iter(get_tag_keys([instance.id])))
+        ).values_list('id', flat=True))
+    update_tag_keys(recipe_ids)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if isinstance(instance, Recipe):
+        bump_recipe_version(instance.author_id, (instance.id,))
+    elif pk_set:
+        bump_recipe_version(recipe_ids=pk_set)
+    else:
+        bump_shared_version(Tag)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def catalog_changed(sender, **kwargs):
+    bump_shared_version(sender)
+
+
+# Поля автора, которые попадают в ответы с рецептами.
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, update_fields=None, **kwargs):
+    # Вход пишет только last_login, кэш рецептов от этого не устаревает.
+    if created or (
+        update_fields is not None and not AUTHOR_FIELDS & set(update_fields)
+    ):
+        return
+    bump_recipe_version(
+        instance.id, instance.recipe.values_list('id', flat=True)
+    )
@@ -0,0 +1,455 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+
+from recipes.models import (FavoriteRecipe, Ingredient, IngredientInRecipe,
+                            Recipe, ShoppingListJob, Tag)
+from users.models import User
+from .cache import get_recipe_cache
+from .pdf_cache import take_pdf_job
+from .search import ingredient_index, pantry_index
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def create_user(number):
+    return User.objects.create_user(
+        username=f'user{number}',
+        email=f'user{number}@foodgram.ru',
+        password='password',
+        first_name='Имя',
+        last_name='Фамилия',
+    )
+
+
+class RecipeTestCase(APITestCase):
+    RECIPES = 25
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [create_user(number) for number in range(3)]
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', slug=f'tag{number}',
+                color=f'#00000{number}'
+            )
+            for number in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(10)
+        ]
+        for number in range(cls.RECIPES):
+            recipe = Recipe.objects.create(
+                author=cls.users[number % len(cls.users)],
+                name=f'Рецепт {number}',
+                text='Описание рецепта',
+                cooking_time=10,
+                image='recipes/recipe.png',
+            )
+            recipe.tags.set(cls.tags[:number % len(cls.tags) + 1])
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=number + 1
+                )
+                for ingredient in cls.ingredients[:3]
+            )
+        cls.recipe = Recipe.objects.first()
+
+    def setUp(self):
+        get_recipe_cache().clear()
+
+
+class RecipeQueryCountTest(RecipeTestCase):
+    """Число запросов на страницу рецептов не зависит от её размера."""
+
+    def assert_list_queries(self, number):
+        for limit in (5, 20):
+            with self.subTest(limit=limit):
+                get_recipe_cache().clear()
+                with self.assertNumQueries(number):
+                    response = self.client.get(
+                        '/api/recipes/', {'limit': limit}
+                    )
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_list_anonymous(self):
+        self.assert_list_queries(4)
+
+    def test_list_authenticated(self):
+        self.client.force_authenticate(self.users[0])
+        self.assert_list_queries(4)
+
+    def test_detail_anonymous(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(len(response.data['ingredients']), 3)
+
+    def test_detail_authenticated(self):
+        self.client.force_authenticate(self.users[0])
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(len(response.data['ingredients']), 3)
+
+
+class RecipeCountersTest(RecipeTestCase):
+    def test_save_keeps_counters(self):
+        recipe = Recipe.objects.get(id=self.recipe.id)
+        self.client.force_authenticate(self.users[1])
+        self.client.post(f'/api/recipes/{recipe.id}/favorite/')
+        self.client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        recipe.name = 'Новое название'
+        recipe.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.shopping_cart_count, 1)
+        response = self.client.delete(f'/api/recipes/{recipe.id}/favorite/')
+        self.assertEqual(response.status_code, 204)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+
+    def test_delete_admin_favorite_keeps_counter_at_zero(self):
+        FavoriteRecipe.objects.create(
+            author=self.users[1], recipe=self.recipe
+        )
+        self.client.force_authenticate(self.users[1])
+        response = self.client.delete(
+            f'/api/recipes/{self.recipe.id}/favorite/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+
+class RecipeCacheTest(RecipeTestCase):
+    def test_favorite_keeps_list_cache(self):
+        self.client.get('/api/recipes/', {'limit': 5})
+        self.client.get(f'/api/recipes/{self.recipe.id}/')
+        user = APIClient()
+        user.force_authenticate(self.users[1])
+        user.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        with self.assertNumQueries(0):
+            self.client.get('/api/recipes/', {'limit': 5})
+        response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.data['favorites_count'], 1)
+
+    def test_recipe_change_resets_list_cache(self):
+        self.client.get('/api/recipes/', {'limit': 5})
+        Recipe.objects.filter(id=self.recipe.id).first().save()
+        with self.assertNumQueries(4):
+            self.client.get('/api/recipes/', {'limit': 5})
+
+    def test_login_keeps_list_cache(self):
+        self.client.get('/api/recipes/', {'limit': 5})
+        self.client.get(f'/api/recipes/{self.recipe.id}/')
+        response = APIClient().post(
+            '/api/auth/token/login/',
+            {'email': self.recipe.author.email, 'password': 'password'}
+        )
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            self.client.get('/api/recipes/', {'limit': 5})
+            self.client.get(f'/api/recipes/{self.recipe.id}/')
+
+    def test_author_rename_resets_list_cache(self):
+        self.client.get('/api/recipes/', {'limit': 5})
+        author = self.recipe.author
+        author.first_name = 'Другое имя'
+        author.save(update_fields=['first_name'])
+        response = self.client.get('/api/recipes/', {'limit': 5})
+        self.assertIn(
+            'Другое имя',
+            [item['author']['first_name'] for item in response.data['results']]
+        )
+
+    def test_recount_resets_snapshots(self):
+        FavoriteRecipe.objects.create(
+            author=self.users[1], recipe=self.recipe
+        )
+        self.client.get(f'/api/recipes/{self.recipe.id}/')
+        call_command('recount_recipe_counters', stdout=StringIO())
+        response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.data['favorites_count'], 1)
+
+
+class RecipeTagsFilterTest(RecipeTestCase):
+    def test_tags_edit_updates_filter(self):
+        recipe = Recipe.objects.get(name='Рецепт 22')
+        self.client.force_authenticate(recipe.author)
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/',
+            {
+                'name': recipe.name,
+                'text': recipe.text,
+                'cooking_time': recipe.cooking_time,
+                'tags': [self.tags[0].id],
+                'ingredients': [
+                    {'id': self.ingredients[0].id, 'amount': 5}
+                ],
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        ids = [
+            item['id'] for item in self.client.get(
+                '/api/recipes/', {'tags': 'tag1', 'limit': 100}
+            ).data['results']
+        ]
+        self.assertNotIn(recipe.id, ids)
+        ids = [
+            item['id'] for item in self.client.get(
+                '/api/recipes/', {'tags': 'tag0', 'limit': 100}
+            ).data['results']
+        ]
+        self.assertIn(recipe.id, ids)
+
+    def test_filter_any_tag_id(self):
+        tag = Tag.objects.create(
+            id=100, name='Тег 100', slug='tag100', color='#000100'
+        )
+        tag.recipe.add(self.recipe)
+        response = self.client.get(
+            '/api/recipes/', {'tags': ['tag100', 'tag0'], 'limit': 100}
+        )
+        ids = [item['id'] for item in response.data['results']]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertIn(self.recipe.id, ids)
+        tag.recipe.clear()
+        response = self.client.get(
+            '/api/recipes/', {'tags': 'tag100', 'limit': 100}
+        )
+        self.assertEqual(response.data['results'], [])
+
+
+class RecipeSearchTest(RecipeTestCase):
+    def count_stats_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                '/api/recipes/', {'search': 'рецепт', 'limit': 5}
+            )
+        self.assertEqual(response.data['count'], self.RECIPES)
+        return sum('AVG(' in query['sql'] for query in context)
+
+    def test_stats_cached_until_index_changes(self):
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(self.count_stats_queries(), 1)
+        self.assertEqual(self.count_stats_queries(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.text = 'Новое описание'
+            self.recipe.save()
+        self.assertEqual(self.count_stats_queries(), 1)
+
+
+class IngredientIndexTest(RecipeTestCase):
+    def test_rebuild_swaps_snapshot(self):
+        old = ingredient_index.refresh()
+        Ingredient.objects.create(
+            name='Ингредиент новый', measurement_unit='г'
+        )
+        response = self.client.get(
+            '/api/ingredients/', {'name': 'ингредиент н'}
+        )
+        self.assertEqual(
+            [item['name'] for item in response.data], ['Ингредиент новый']
+        )
+        self.assertIsNot(ingredient_index.snapshot, old)
+        self.assertEqual(len(old.rows), len(self.ingredients))
+        self.assertEqual(len(old.gram_counts), len(old.rows))
+
+
+class PantryTest(RecipeTestCase):
+    def test_toggle(self):
+        self.client.force_authenticate(self.users[0])
+        url = f'/api/ingredients/{self.ingredients[0].id}/pantry/'
+        for method, code in (
+            ('post', 201), ('post', 400), ('delete', 204), ('delete', 400)
+        ):
+            with self.subTest(method=method, code=code):
+                response = getattr(self.client, method)(url)
+                self.assertEqual(response.status_code, code)
+        for method in ('post', 'delete'):
+            with self.subTest(method=method):
+                response = getattr(self.client, method)(
+                    '/api/ingredients/100500/pantry/'
+                )
+                self.assertEqual(response.status_code, 404)
+
+
+class PantryIndexTest(RecipeTestCase):
+    def test_update_waits_for_commit(self):
+        pantry_index.refresh()
+        ingredient_ids = [self.ingredients[0].id]
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                pantry_index.update_recipe(self.recipe.id, ingredient_ids)
+                raise ValueError
+        self.assertEqual(
+            len(pantry_index.ingredients[self.recipe.id]), 3
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            pantry_index.update_recipe(self.recipe.id, ingredient_ids)
+            self.assertEqual(
+                len(pantry_index.ingredients[self.recipe.id]), 3
+            )
+        self.assertEqual(
+            pantry_index.ingredients[self.recipe.id], tuple(ingredient_ids)
+        )
+
+
+class SubscriptionsTest(RecipeTestCase):
+    def test_empty_subscriptions(self):
+        self.client.force_authenticate(self.users[0])
+        for params in ({'limit': 6}, {'limit': 6, 'cursor': ''}):
+            with self.subTest(params=params):
+                response = self.client.get(
+                    '/api/users/subscriptions/', params
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data['results'], [])
+
+    def test_subscriptions_recipes(self):
+        self.client.force_authenticate(self.users[0])
+        self.client.post(f'/api/users/{self.users[1].id}/subscribe/')
+        response = self.client.get(
+            '/api/users/subscriptions/', {'limit': 6, 'recipes_limit': 2}
+        )
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(len(response.data['results'][0]['recipes']), 2)
+
+
+class ShoppingListJobTest(RecipeTestCase):
+    def create_job(self, status, started=None):
+        return ShoppingListJob.objects.create(
+            user=self.users[0], key='key', items=[], status=status,
+            started=started
+        )
+
+    def test_take_skips_live_and_reclaims_stale_jobs(self):
+        now = timezone.now()
+        running = ShoppingListJob.Status.RUNNING
+        self.create_job(running, now)
+        stale = self.create_job(running, now - timedelta(hours=1))
+        pending = self.create_job(ShoppingListJob.Status.PENDING)
+        self.assertEqual(take_pdf_job(), stale)
+        self.assertEqual(take_pdf_job(), pending)
+        self.assertIsNone(take_pdf_job())
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, running)
+        self.assertGreater(stale.started, now)
+
+    def test_failed_job_poll(self):
+        job = self.create_job(ShoppingListJob.Status.FAILED)
+        self.client.force_authenticate(self.users[0])
+        response = self.client.get(
+            f'/api/recipes/download_shopping_cart/{job.id}/'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'failed')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeWriteTest(RecipeTestCase):
+    IMAGE = (
+        'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJ'
+        'AAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+    )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = Recipe.objects.get(name='Рецепт 22')
+        self.client.force_authenticate(self.recipe.author)
+
+    def get_data(self, **changes):
+        data = {
+            'name': 'Новый рецепт',
+            'text': 'Описание нового рецепта',
+            'cooking_time': 15,
+            'tags': [tag.id for tag in self.tags[:2]],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in self.ingredients[:4]
+            ],
+        }
+        data.update(changes)
+        return data
+
+    def get_recipe_data(self, **changes):
+        data = {
+            'name': self.recipe.name,
+            'text': self.recipe.text,
+            'cooking_time': self.recipe.cooking_time,
+            'tags': [tag.id for tag in self.recipe.tags.all()],
+            'ingredients': [
+                {'id': row.ingredient_id, 'amount': row.amount}
+                for row in self.recipe.recipe.all()
+            ],
+        }
+        data.update(changes)
+        return data
+
+    def test_create_queries(self):
+        with self.assertNumQueries(24):
+            response = self.client.post(
+                '/api/recipes/', self.get_data(image=self.IMAGE),
+                format='json'
+            )
+        self.assertEqual(response.status_code, 201)
+
+    def test_update_name_queries(self):
+        data = self.get_recipe_data(name='Другое название')
+        with self.assertNumQueries(17):
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.id}/', data, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_update_ingredients_queries(self):
+        data = self.get_recipe_data(ingredients=[
+            {'id': self.ingredients[0].id, 'amount': 100},
+            {'id': self.ingredients[1].id, 'amount': 23},
+            {'id': self.ingredients[5].id, 'amount': 7},
+        ])
+        with self.assertNumQueries(25):
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.id}/', data, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            dict(self.recipe.recipe.values_list('ingredient_id', 'amount')),
+            {
+                self.ingredients[0].id: 100,
+                self.ingredients[1].id: 23,
+                self.ingredients[5].id: 7,
+            }
+        )
+
+    def test_invalid_ingredients(self):
+        for ingredients in (
+            [{'id': 100500, 'amount': 1}],
+            [{'amount': 1}],
+            [{'id': 'первый', 'amount': 1}],
+        ):
+            with self.subTest(ingredients=ingredients):
+                response = self.client.post(
+                    '/api/recipes/',
+                    self.get_data(image=self.IMAGE, ingredients=ingredients),
+                    format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Recipe.objects.filter(name='Новый рецепт').exists())
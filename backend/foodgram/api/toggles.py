@@ -0,0 +1,133 @@
+from django.db import connection
+from django.http import Http404
+
+from recipes.models import Recipe
+
+SHORT_RECIPE_FIELDS = ('id', 'name', 'image', 'cooking_time', 'author')
+
+
+def get_id_or_404(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise Http404
+
+
+def quote(name):
+    return connection.ops.quote_name(name)
+
+
+def get_column(model, field):
+    return quote(model._meta.get_field(field).column)
+
+
+def insert_relations(model, owner_field, target_field, owner_id,
+                     target_ids):
+    """Создаёт связи одной командой INSERT ... ON CONFLICT DO NOTHING.
+
+    Строки вставляются только для существующих целевых объектов.
+    Остальные поля заполняются так же, как при save() (auto_now_add,
+    default). Возвращает {id цели: id новой строки} для вставленных
+    связей; уже существовавшие и несуществующие цели в него не входят.
+    """
+    if not target_ids:
+        return {}
+    target_model = model._meta.get_field(target_field).related_model
+    obj = model(**{model._meta.get_field(owner_field).attname: owner_id})
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key
+        and field.name not in (owner_field, target_field)
+    ]
+    sql = (
+        'INSERT INTO {table} ({owner}, {target}{columns}) '
+        'SELECT %s, {target_pk}{placeholders} FROM {target_table} '
+        'WHERE {target_pk} IN ({targets}) '
+        'ON CONFLICT DO NOTHING RETURNING {target}, {pk}'
+    ).format(
+        table=quote(model._meta.db_table),
+        owner=get_column(model, owner_field),
+        target=get_column(model, target_field),
+        columns=''.join(f', {quote(field.column)}' for field in fields),
+        target_pk=quote(target_model._meta.pk.column),
+        placeholders=', %s' * len(fields),
+        target_table=quote(target_model._meta.db_table),
+        targets=', '.join(['%s'] * len(target_ids)),
+        pk=quote(model._meta.pk.column),
+    )
+    params = [owner_id]
+    params.extend(
+        field.get_db_prep_save(field.pre_save(obj, True), connection)
+        for field in fields
+    )
+    params.extend(target_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return dict(cursor.fetchall())
+
+
+def insert_relation(model, owner_field, target_field, owner_id, target_id):
+    """Возвращает id новой связи или None, если она уже была или цели нет."""
+    return insert_relations(
+        model, owner_field, target_field, owner_id, (target_id,)
+    ).get(target_id)
+
+
+def delete_relations(model, owner_field, target_field, owner_id,
+                     target_ids):
+    """Удаляет связи одной командой DELETE ... RETURNING.
+
+    Возвращает множество id целей, связи с которыми были удалены.
+    """
+    if not target_ids:
+        return set()
+    sql = (
+        'DELETE FROM {table} WHERE {owner} = %s AND {target} IN ({targets}) '
+        'RETURNING {target}'
+    ).format(
+        table=quote(model._meta.db_table),
+        owner=get_column(model, owner_field),
+        target=get_column(model, target_field),
+        targets=', '.join(['%s'] * len(target_ids)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (owner_id, *target_ids))
+        return {row[0] for row in cursor.fetchall()}
+
+
+def delete_relation(model, owner_field, target_field, owner_id, target_id):
+    """Возвращает True, если связь была и удалена."""
+    return target_id in delete_relations(
+        model, owner_field, target_field, owner_id, (target_id,)
+    )
+
+
+def update_recipe_counters(recipe_ids, counter, delta):
+    """Сдвигает счётчик рецептов и сразу возвращает их краткие данные.
+
+    Счётчик не опускается ниже нуля: связь, созданная в админке, его
+    не увеличила, и её удаление через API не должно нарушить CHECK.
+    """
+    if not recipe_ids:
+        return []
+    column = get_column(Recipe, counter)
+    sql = (
+        'UPDATE {table} SET {column} = '
+        'CASE WHEN {column} + %s < 0 THEN 0 ELSE {column} + %s END '
+        'WHERE {pk} IN ({recipes}) RETURNING {fields}'
+    ).format(
+        table=quote(Recipe._meta.db_table),
+        column=column,
+        pk=quote(Recipe._meta.pk.column),
+        recipes=', '.join(['%s'] * len(recipe_ids)),
+        fields=', '.join(
+            get_column(Recipe, field) for field in SHORT_RECIPE_FIELDS
+        ),
+    )
+    return list(Recipe.objects.raw(sql, (delta, delta, *recipe_ids)))
+
+
+def update_recipe_counter(recipe_id, counter, delta):
+    return next(
+        iter(update_recipe_counters((recipe_id,), counter, delta)), None
+    )
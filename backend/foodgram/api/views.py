@@ -1,29 +1,108 @@
-from django.db.models import Sum
+import os
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import (IsAuthenticatedOrReadOnly,
                                         IsAuthenticated)
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 
-from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
-                            ShoppingCart, Subscribe, Tag, IngredientInRecipe)
+from recipes.models import (FavoriteRecipe, FeedEntry, Ingredient, Pantry,
+                            Recipe, ShoppingCart, ShoppingCartIngredient,
+                            ShoppingListJob, Subscribe, Tag)
 from users.models import User
-from .filters import IngredientFilter, RecipeFilter
-from .pagination import CustomPagination
+from .cache import (bump_recipe_counters, bump_user_version,
+                    cache_anonymous_response, model_etag, recipe_etag)
+from .fast_serializers import build_fast_recipe_snapshots
+from .filters import RecipeFilter
+from .pagination import (CursorPaginationMixin, CustomPagination,
+                         PubDateCursorPagination)
 from .permissions import IsAdminOrAuthorOrReadOnly
-from .serializers import (IngredientSerializer, RecipeCreateSerializer,
-                          RecipeReadSerializer, SubscribeSerializer,
-                          TagSerializer, ShortRecipeSerializer)
-from .generate_pdf_file import generate_pdf_file
+from .renderers import (CSVRenderer, FastJSONRenderer, PDFRenderer,
+                        PlainTextRenderer)
+from .search import FUZZY_LIMIT, fuzzy_search_ingredients, ingredient_index
+from .serializers import (BATCH_SIZE, BatchSerializer, IngredientSerializer,
+                          RecipeCreateSerializer, RecipeReadSerializer,
+                          ShoppingCartIngredientSerializer,
+                          SubscribeSerializer, TagSerializer,
+                          ShortRecipeSerializer, get_recipe_fields)
+from .pdf_cache import (enqueue_pdf_job, get_cached_pdf, get_pdf_key,
+                        get_pdf_path, touch_cached_pdf)
+from .shopping_list import (SHOPPING_LIST_FORMATS, add_to_shopping_list,
+                            remove_from_shopping_list)
+from .toggles import (delete_relation, delete_relations, get_id_or_404,
+                      insert_relation, insert_relations,
+                      update_recipe_counter, update_recipe_counters)
+
+RECIPE_COUNTERS = {
+    FavoriteRecipe: 'favorites_count',
+    ShoppingCart: 'shopping_cart_count',
+}
+DEFERRABLE_RECIPE_FIELDS = (
+    'name', 'image', 'text', 'cooking_time',
+    'favorites_count', 'shopping_cart_count',
+)
+RECIPE_ANNOTATION_FIELDS = {
+    'favorited': 'is_favorited',
+    'in_shopping_cart': 'is_in_shopping_cart',
+    'author_subscribed': 'author',
+}
+
+
+def get_batch_ids(request):
+    serializer = BatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data['ids']
+
+
+def get_batch_results(ids, done, done_status, model, errors=None,
+                      conflict=None):
+    """Результат по каждому id пакета: done_status, 400 или 404."""
+    errors = errors or {}
+    rest = [pk for pk in ids if pk not in done and pk not in errors]
+    found = set(
+        model.objects.filter(id__in=rest).values_list('id', flat=True)
+    ) if rest else set()
+    results = []
+    for pk in ids:
+        if pk in done:
+            results.append({'id': pk, 'status': done_status})
+        elif pk in errors or pk in found:
+            result = {'id': pk, 'status': status.HTTP_400_BAD_REQUEST}
+            error = errors.get(pk, conflict)
+            if error:
+                result['error'] = error
+            results.append(result)
+        else:
+            results.append({'id': pk, 'status': status.HTTP_404_NOT_FOUND})
+    return results
 
 
-class UsersViewSet(UserViewSet):
+class UsersViewSet(CursorPaginationMixin, UserViewSet):
     queryset = User.objects.all()
     pagination_class = CustomPagination
+    cursor_pagination_actions = ('subscriptions',)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(followed=Exists(
+                Subscribe.objects.filter(user=user, author=OuterRef('pk'))
+            ))
+        return queryset
 
     @action(
         detail=True,
@@ -32,61 +111,270 @@ class UsersViewSet(UserViewSet):
         permission_classes=[IsAuthenticatedOrReadOnly],
     )
     def subscribe(self, request, **kwargs):
-        user = get_object_or_404(User, id=kwargs.get('id'))
-        subscribe = Subscribe.objects.filter(user=request.user, author=user)
+        author_id = get_id_or_404(kwargs.get('id'))
         if request.method == 'POST':
-            if user == request.user:
+            if author_id == request.user.id:
                 msg = {'error': 'Нельзя подписаться на самого себя.'}
                 return Response(msg, status=status.HTTP_400_BAD_REQUEST)
-            obj, created = Subscribe.objects.get_or_create(
+            with transaction.atomic():
+                subscribe_id = insert_relation(
+                    Subscribe, 'user', 'author', request.user.id, author_id
+                )
+                if subscribe_id is None:
+                    get_object_or_404(User, id=author_id)
+                    msg = {'error': 'Вы уже подписаны на этого пользователя.'}
+                    return Response(msg, status=status.HTTP_400_BAD_REQUEST)
+                FeedEntry.objects.bulk_create(
+                    (
+                        FeedEntry(user=request.user, recipe_id=pk,
+                                  pub_date=pub_date)
+                        for pk, pub_date in Recipe.objects.filter(
+                            author_id=author_id
+                        ).values_list('id', 'pub_date')
+                    ),
+                    batch_size=1000,
+                    ignore_conflicts=True
+                )
+            bump_user_version(request.user.id)
+            obj = Subscribe(
+                id=subscribe_id,
                 user=request.user,
-                author=user
+                author=User.objects.get(id=author_id)
             )
-            if not created:
-                msg = {'error': 'Вы уже подписаны на этого пользователя.'}
-                return Response(msg, status=status.HTTP_400_BAD_REQUEST)
             serializer = SubscribeSerializer(obj, context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        if not subscribe.exists():
-            msg = {'error': 'Вы не подписаны на этого пользователя.'}
-            return Response(msg, status=status.HTTP_400_BAD_REQUEST)
-        subscribe.delete()
+        with transaction.atomic():
+            if not delete_relation(
+                Subscribe, 'user', 'author', request.user.id, author_id
+            ):
+                get_object_or_404(User, id=author_id)
+                msg = {'error': 'Вы не подписаны на этого пользователя.'}
+                return Response(msg, status=status.HTTP_400_BAD_REQUEST)
+            FeedEntry.objects.filter(
+                user=request.user, recipe__author_id=author_id
+            ).delete()
+        bump_user_version(request.user.id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
         detail=False,
-        methods=['GET'],
-        permission_classes=[IsAuthenticatedOrReadOnly],
+        methods=['GET', 'POST', 'DELETE'],
+        permission_classes=(IsAuthenticated,),
     )
     def subscriptions(self, request):
-        subscribe = Subscribe.objects.filter(user=request.user)
+        if request.method != 'GET':
+            return self.subscribe_batch(request)
+        subscribe = Subscribe.objects.filter(
+            user=request.user
+        ).select_related('author').annotate(recipes_count=Coalesce(
+            Subquery(
+                Recipe.objects.filter(author=OuterRef('author')).order_by(
+                ).values('author').annotate(total=Count('id')).values('total')
+            ),
+            0
+        ))
         pages = self.paginate_queryset(subscribe)
         serializer = SubscribeSerializer(
             pages, many=True, context={'request': request}
         )
         return self.get_paginated_response(serializer.data)
 
+    def subscribe_batch(self, request):
+        ids = get_batch_ids(request)
+        errors = {}
+        with transaction.atomic():
+            if request.method == 'POST':
+                if request.user.id in ids:
+                    errors[request.user.id] = (
+                        'Нельзя подписаться на самого себя.'
+                    )
+                done = set(insert_relations(
+                    Subscribe, 'user', 'author', request.user.id,
+                    [pk for pk in ids if pk not in errors]
+                ))
+                FeedEntry.objects.bulk_create(
+                    (
+                        FeedEntry(user=request.user, recipe_id=pk,
+                                  pub_date=pub_date)
+                        for pk, pub_date in Recipe.objects.filter(
+                            author_id__in=done
+                        ).values_list('id', 'pub_date')
+                    ),
+                    batch_size=1000,
+                    ignore_conflicts=True
+                )
+                done_status = status.HTTP_201_CREATED
+                conflict = 'Вы уже подписаны на этого пользователя.'
+            else:
+                done = delete_relations(
+                    Subscribe, 'user', 'author', request.user.id, ids
+                )
+                if done:
+                    FeedEntry.objects.filter(
+                        user=request.user, recipe__author_id__in=done
+                    ).delete()
+                done_status = status.HTTP_204_NO_CONTENT
+                conflict = 'Вы не подписаны на этого пользователя.'
+        if done:
+            bump_user_version(request.user.id)
+        return Response(get_batch_results(
+            ids, done, done_status, User, errors, conflict
+        ))
+
 
+@method_decorator(condition(etag_func=model_etag(Tag)), name='list')
+@method_decorator(condition(etag_func=model_etag(Tag)), name='retrieve')
 class TagViewSet(viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
 
 
+@method_decorator(
+    condition(etag_func=model_etag(Ingredient)), name='list'
+)
+@method_decorator(
+    condition(etag_func=model_etag(Ingredient)), name='retrieve'
+)
 class IngredientViewSet(viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
-    filter_backends = (IngredientFilter,)
-    search_fields = ('^name',)
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name', '')
+        limit = request.query_params.get('limit')
+        limit = int(limit) if limit and limit.isdigit() else None
+        if not request.query_params.get('fuzzy'):
+            found = ingredient_index.search(name, limit)
+            if found or not name:
+                return Response(found)
+        return Response(fuzzy_search_ingredients(name, limit or FUZZY_LIMIT))
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        url_path='pantry',
+        permission_classes=(IsAuthenticated,),
+    )
+    def pantry_list(self, request):
+        serializer = self.get_serializer(
+            Ingredient.objects.filter(in_pantry__user=request.user),
+            many=True
+        )
+        return Response(serializer.data)
+
+    @action(
+        detail=True,
+        methods=['POST', 'DELETE'],
+        url_path='pantry',
+        permission_classes=[IsAuthenticated],
+    )
+    def pantry(self, request, **kwargs):
+        ingredient_id = get_id_or_404(kwargs.get('pk'))
+        if request.method == 'POST':
+            ingredient = get_object_or_404(Ingredient, id=ingredient_id)
+            if insert_relation(
+                Pantry, 'user', 'ingredient', request.user.id, ingredient_id
+            ) is None:
+                return Response(status=status.HTTP_400_BAD_REQUEST)
+            serializer = self.get_serializer(ingredient)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        if not delete_relation(
+            Pantry, 'user', 'ingredient', request.user.id, ingredient_id
+        ):
+            get_object_or_404(Ingredient, id=ingredient_id)
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(CursorPaginationMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     pagination_class = CustomPagination
     filterset_class = RecipeFilter
     permission_classes = (IsAdminOrAuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
+    # Чем строить снимки рецептов: build_recipe_snapshots из serializers
+    # даёт тот же результат через поля DRF, но заметно медленнее.
+    snapshot_builder = staticmethod(build_fast_recipe_snapshots)
+
+    def get_queryset(self):
+        fields = self.get_fields()
+        queryset = Recipe.objects.all()
+        if fields is None or 'author' in fields:
+            queryset = queryset.select_related('author')
+        if fields is not None:
+            # pub_date нужен курсорной пагинации, автор - правам доступа.
+            queryset = queryset.defer(*(
+                name for name in DEFERRABLE_RECIPE_FIELDS
+                if name not in fields
+            ))
+        user = self.request.user
+        if user.is_authenticated:
+            annotations = {
+                'favorited': Exists(FavoriteRecipe.objects.filter(
+                    author=user, recipe=OuterRef('pk')
+                )),
+                'in_shopping_cart': Exists(ShoppingCart.objects.filter(
+                    author=user, recipe=OuterRef('pk')
+                )),
+                'author_subscribed': Exists(Subscribe.objects.filter(
+                    user=user, author=OuterRef('author')
+                )),
+            }
+            queryset = queryset.annotate(**{
+                annotation: expression
+                for annotation, expression in annotations.items()
+                if fields is None
+                or RECIPE_ANNOTATION_FIELDS[annotation] in fields
+            })
+        return queryset
+
+    def get_fields(self):
+        """Поля рецепта из ?fields= и ?omit=; None - все поля."""
+        if self.request.method != 'GET':
+            return None
+        return get_recipe_fields(self.request.query_params)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_fields()
+        context['snapshot_builder'] = self.snapshot_builder
+        return context
+
+    @cache_anonymous_response
+    def list(self, request, *args, **kwargs):
+        if 'ids' in request.query_params:
+            return self.list_by_ids(request)
+        return super().list(request, *args, **kwargs)
+
+    def list_by_ids(self, request):
+        """Рецепты из ?ids=1,2,3 в порядке запроса, без пагинации."""
+        try:
+            ids = list(dict.fromkeys(
+                int(pk) for pk in request.query_params['ids'].split(',')
+            ))
+        except ValueError:
+            raise ValidationError(
+                {'ids': 'Укажите id рецептов числами через запятую.'}
+            )
+        if len(ids) > BATCH_SIZE:
+            raise ValidationError(
+                {'ids': f'Не больше {BATCH_SIZE} рецептов за запрос.'}
+            )
+        recipes = self.filter_queryset(
+            self.get_queryset()
+        ).filter(id__in=ids).in_bulk()
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in ids if pk in recipes], many=True
+        )
+        return Response(serializer.data)
+
+    @method_decorator(vary_on_headers('Authorization'))
+    @method_decorator(condition(etag_func=recipe_etag))
+    @cache_anonymous_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
     def get_serializer_class(self):
         if self.request.method in ['POST', 'PATCH', 'PUT']:
@@ -94,21 +382,61 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return RecipeReadSerializer
 
     def add_recipe(self, model, request, pk):
-        recipe = get_object_or_404(Recipe, id=pk)
-        models = model.objects.filter(author=request.user, recipe=recipe)
-        if models.exists():
-            return Response(status=status.HTTP_400_BAD_REQUEST)
-        model(author=request.user, recipe=recipe).save()
+        recipe_id = get_id_or_404(pk)
+        with transaction.atomic():
+            if insert_relation(
+                model, 'author', 'recipe', request.user.id, recipe_id
+            ) is None:
+                get_object_or_404(Recipe, id=recipe_id)
+                return Response(status=status.HTTP_400_BAD_REQUEST)
+            recipe = update_recipe_counter(
+                recipe_id, RECIPE_COUNTERS[model], 1
+            )
+            if model is ShoppingCart:
+                add_to_shopping_list(request.user.id, recipe_id)
+        bump_recipe_counters((recipe.id,))
         serializer = ShortRecipeSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def del_recipe(self, model, request, pk):
-        recipe = get_object_or_404(Recipe, id=pk)
-        models = model.objects.filter(author=request.user, recipe=recipe)
-        if models.exists():
-            models.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+        recipe_id = get_id_or_404(pk)
+        with transaction.atomic():
+            if not delete_relation(
+                model, 'author', 'recipe', request.user.id, recipe_id
+            ):
+                get_object_or_404(Recipe, id=recipe_id)
+                return Response(status=status.HTTP_400_BAD_REQUEST)
+            recipe = update_recipe_counter(
+                recipe_id, RECIPE_COUNTERS[model], -1
+            )
+            if model is ShoppingCart:
+                remove_from_shopping_list(request.user.id, recipe_id)
+        bump_recipe_counters((recipe.id,))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def batch_recipes(self, model, request):
+        ids = get_batch_ids(request)
+        with transaction.atomic():
+            if request.method == 'POST':
+                done = set(insert_relations(
+                    model, 'author', 'recipe', request.user.id, ids
+                ))
+                delta, done_status = 1, status.HTTP_201_CREATED
+            else:
+                done = delete_relations(
+                    model, 'author', 'recipe', request.user.id, ids
+                )
+                delta, done_status = -1, status.HTTP_204_NO_CONTENT
+            recipes = update_recipe_counters(
+                list(done), RECIPE_COUNTERS[model], delta
+            )
+            if model is ShoppingCart and done:
+                if delta > 0:
+                    add_to_shopping_list(request.user.id, *done)
+                else:
+                    remove_from_shopping_list(request.user.id, *done)
+        bump_recipe_counters([recipe.id for recipe in recipes])
+        return Response(get_batch_results(ids, done, done_status, Recipe))
 
     @action(
         detail=True,
@@ -122,6 +450,15 @@ class RecipeViewSet(viewsets.ModelViewSet):
         if request.method == 'DELETE':
             return self.del_recipe(FavoriteRecipe, request, kwargs.get('pk'))
 
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='favorite',
+        permission_classes=(IsAuthenticated,),
+    )
+    def favorite_batch(self, request):
+        return self.batch_recipes(FavoriteRecipe, request)
+
     @action(
         detail=True,
         methods=['POST', 'DELETE'],
@@ -134,25 +471,134 @@ class RecipeViewSet(viewsets.ModelViewSet):
         if request.method == 'DELETE':
             return self.del_recipe(ShoppingCart, request, kwargs.get('pk'))
 
+    @action(
+        detail=False,
+        methods=['GET', 'POST', 'DELETE'],
+        url_path='shopping_cart',
+        permission_classes=(IsAuthenticated,),
+    )
+    def shopping_cart_list(self, request):
+        if request.method != 'GET':
+            return self.batch_recipes(ShoppingCart, request)
+        serializer = ShoppingCartIngredientSerializer(
+            request.user.shopping_cart_totals.select_related(
+                'ingredient'
+            ).order_by('ingredient__name'),
+            many=True
+        )
+        return Response(serializer.data)
+
     @action(
         detail=False,
         methods=['GET'],
         permission_classes=(IsAuthenticated,),
     )
+    def feed(self, request):
+        paginator = PubDateCursorPagination()
+        entries = paginator.paginate_queryset(
+            FeedEntry.objects.filter(user=request.user), request, view=self
+        )
+        recipes = self.get_queryset().in_bulk(
+            [entry.recipe_id for entry in entries]
+        )
+        serializer = RecipeReadSerializer(
+            [
+                recipes[entry.recipe_id] for entry in entries
+                if entry.recipe_id in recipes
+            ],
+            many=True,
+            context=self.get_serializer_context()
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(
+            PDFRenderer, PlainTextRenderer, CSVRenderer, FastJSONRenderer
+        ),
+    )
     def download_shopping_cart(self, request):
-        get_cart = IngredientInRecipe.objects.filter(
-            recipe__is_in_shopping_cart__author=request.user
-        ).values(
+        get_cart = ShoppingCartIngredient.objects.filter(
+            user=request.user
+        ).values_list(
             'ingredient__name',
+            'amount',
             'ingredient__measurement_unit'
-        ).annotate(Sum('amount'))
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment;'
-        text_cart = ''
-        for value in get_cart:
-            text_cart += (
-                value['ingredient__name'] + ' - '
-                + str(value['amount__sum']) + ' '
-                + value['ingredient__measurement_unit'] + '<br/>'
+        ).order_by('ingredient__name')
+        renderer = request.accepted_renderer
+        if renderer.format in SHOPPING_LIST_FORMATS:
+            response = StreamingHttpResponse(
+                SHOPPING_LIST_FORMATS[renderer.format](get_cart.iterator()),
+                content_type=f'{renderer.media_type}; charset=utf-8'
+            )
+            response['Content-Disposition'] = (
+                f'attachment; filename="shopping_list.{renderer.format}"'
+            )
+            return response
+        items = [list(item) for item in get_cart]
+        key = get_pdf_key(items)
+        path = get_pdf_path(key)
+        if (
+            request.query_params.get('async')
+            and len(items) > settings.SHOPPING_LIST_SYNC_LIMIT
+            and not touch_cached_pdf(path)
+        ):
+            job = enqueue_pdf_job(request.user, items, key)
+            return self.job_response(request, job)
+        return self.pdf_response(get_cached_pdf(items))
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        url_path=r'download_shopping_cart/(?P<job_id>\d+)',
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(PDFRenderer, FastJSONRenderer),
+    )
+    def shopping_cart_job(self, request, job_id):
+        job = get_object_or_404(
+            ShoppingListJob, id=job_id, user=request.user
+        )
+        if job.status == ShoppingListJob.Status.FAILED:
+            # Ошибка задания - результат опроса, а не сбой сервера.
+            return Response({
+                'id': job.id,
+                'status': job.status,
+                'error': 'Не удалось сформировать список покупок.',
+            })
+        if job.status != ShoppingListJob.Status.DONE:
+            return self.job_response(request, job)
+        path = get_pdf_path(job.key)
+        if not touch_cached_pdf(path):
+            path = get_cached_pdf(job.items)
+        return self.pdf_response(path)
+
+    def job_response(self, request, job):
+        url = reverse(
+            'recipes-shopping-cart-job',
+            kwargs={'job_id': job.id},
+            request=request
+        )
+        return Response(
+            {'id': job.id, 'status': job.status, 'url': url},
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': url}
+        )
+
+    def pdf_response(self, path):
+        if settings.SHOPPING_LIST_ACCEL_PREFIX:
+            response = HttpResponse(content_type='application/pdf')
+            response['X-Accel-Redirect'] = (
+                settings.SHOPPING_LIST_ACCEL_PREFIX + os.path.basename(path)
             )
-        return generate_pdf_file(text_cart, response)
+            response['Content-Disposition'] = (
+                'attachment; filename="shopping_list.pdf"'
+            )
+            return response
+        return FileResponse(
+            open(path, 'rb'),
+            as_attachment=True,
+            filename='shopping_list.pdf',
+            content_type='application/pdf'
+        )
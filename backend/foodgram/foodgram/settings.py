@@ -26,6 +26,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -84,6 +85,38 @@ DATABASES = {
 }
 
 
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+)
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    }
+}
+
+# MAX_ENTRIES понимают только локальные бэкенды, клиенты Memcached
+# и Redis получают OPTIONS как есть и падают на незнакомом параметре.
+if CACHE_BACKEND.rsplit('.', 1)[0] in (
+    'django.core.cache.backends.locmem',
+    'django.core.cache.backends.filebased',
+    'django.core.cache.backends.db',
+):
+    # Снимки и версии рецептов: по два ключа на рецепт.
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 20000)),
+    }
+
+# Кэш ответов анонимным пользователям для /api/recipes/.
+# LocMemCache живёт внутри процесса: при нескольких воркерах gunicorn
+# для мгновенной инвалидации нужен общий бэкенд (Redis, Memcached).
+RECIPES_CACHE = 'default'
+RECIPES_CACHE_TIMEOUT = 60 * 15
+# Снимки сбрасываются сигналами, срок - страховка от записей в обход них.
+RECIPE_SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -125,6 +158,24 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Готовые PDF списков покупок. Каталог не раздаётся как /media/:
+# nginx отдаёт файлы только по X-Accel-Redirect с префиксом ниже,
+# без префикса файл отдаёт сам Django.
+SHOPPING_LIST_CACHE_DIR = os.getenv(
+    'SHOPPING_LIST_CACHE_DIR', os.path.join(BASE_DIR, 'shopping_lists')
+)
+SHOPPING_LIST_CACHE_SIZE = int(
+    os.getenv('SHOPPING_LIST_CACHE_SIZE', 100 * 1024 * 1024)
+)
+SHOPPING_LIST_ACCEL_PREFIX = os.getenv('SHOPPING_LIST_ACCEL_PREFIX', '')
+# С ?async=1 списки длиннее этого числа строк формирует фоновый
+# process_shopping_lists, а клиент получает 202 и адрес задачи.
+SHOPPING_LIST_SYNC_LIMIT = 300
+SHOPPING_LIST_JOB_TTL = 60 * 60 * 24
+# Задачу, которая формируется дольше, считаем брошенной упавшим
+# обработчиком: её заберёт любой другой.
+SHOPPING_LIST_JOB_TIMEOUT = 60 * 10
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -139,6 +190,16 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
+    # JSON через orjson, если он установлен, иначе стандартный json.
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 DJOSER = {
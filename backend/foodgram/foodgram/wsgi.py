@@ -5,3 +5,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
 application = get_wsgi_application()
+
+# Импорт только после настройки Django: модели уже загружены.
+from api.search import warm_up_ingredient_index  # noqa: E402
+
+warm_up_ingredient_index()
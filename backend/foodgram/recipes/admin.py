@@ -1,7 +1,7 @@
 from django.contrib import admin
 
-from .models import (FavoriteRecipe, Ingredient, IngredientInRecipe, Recipe,
-                     ShoppingCart, Subscribe, Tag)
+from .models import (FavoriteRecipe, Ingredient, IngredientInRecipe, Pantry,
+                     Recipe, ShoppingCart, Subscribe, Tag)
 
 
 @admin.register(Ingredient)
@@ -40,16 +40,14 @@ class RecipeAdmin(admin.ModelAdmin):
         'text',
         'cooking_time',
         'pub_date',
-        'favorite_count'
+        'favorites_count',
+        'shopping_cart_count'
     )
+    readonly_fields = ('favorites_count', 'shopping_cart_count')
     search_fields = ('name', 'author', 'tag')
     list_filter = ('name',)
     inlines = (IngredientInRecipeAdmin,)
 
-    @admin.display(description='В избранном')
-    def favorite_count(self, obj):
-        return obj.is_favorited.count()
-
 
 @admin.register(Subscribe)
 class SubscribeAdmin(admin.ModelAdmin):
@@ -78,3 +76,13 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     )
     search_fields = ('author',)
     list_filter = ('author',)
+
+
+@admin.register(Pantry)
+class PantryAdmin(admin.ModelAdmin):
+    list_display = (
+        'user',
+        'ingredient',
+    )
+    search_fields = ('user',)
+    list_filter = ('user',)
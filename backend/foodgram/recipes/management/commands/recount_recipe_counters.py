@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from api.cache import bump_recipe_counters
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart
+
+COUNTERS = {
+    'favorites_count': FavoriteRecipe,
+    'shopping_cart_count': ShoppingCart,
+}
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики избранного и списков покупок рецептов.'
+
+    def handle(self, **kwargs):
+        actual = {
+            field: Coalesce(Subquery(
+                model.objects.filter(recipe=OuterRef('pk')).order_by().values(
+                    'recipe'
+                ).annotate(total=Count('pk')).values('total')
+            ), 0)
+            for field, model in COUNTERS.items()
+        }
+        drift = Q()
+        for field, value in actual.items():
+            drift |= ~Q(**{field: value})
+        recipe_ids = list(
+            Recipe.objects.filter(drift).values_list('id', flat=True)
+        )
+        repaired = Recipe.objects.filter(id__in=recipe_ids).update(**actual)
+        bump_recipe_counters(recipe_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлены счётчики у рецептов: {repaired}.'
+        ))
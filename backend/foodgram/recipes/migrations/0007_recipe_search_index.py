@@ -0,0 +1,83 @@
+# Generated by Django 3.2.15 on 2026-10-18 05:37
+
+import re
+from collections import Counter
+
+from django.db import migrations, models
+import django.db.models.deletion
+from snowballstemmer import stemmer
+
+# Копия анализатора api.search на момент миграции: историческая миграция
+# не должна зависеть от текущего кода приложения.
+STOP_WORDS = frozenset((
+    'а', 'без', 'в', 'во', 'да', 'для', 'до', 'же', 'за', 'и', 'из', 'или',
+    'к', 'как', 'ко', 'на', 'не', 'но', 'о', 'об', 'от', 'по', 'при', 'с',
+    'со', 'то', 'у', 'что',
+))
+TERM_MAX_LENGTH = 100
+
+
+def analyze(text):
+    words = [
+        word for word in re.findall(r'\w+', text.casefold().replace('ё', 'е'))
+        if word not in STOP_WORDS
+    ]
+    return [
+        term[:TERM_MAX_LENGTH]
+        for term in stemmer('russian').stemWords(words)
+    ]
+
+
+def fill_search_index(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeSearchTerm = apps.get_model('recipes', 'RecipeSearchTerm')
+    recipes = []
+    for recipe in Recipe.objects.only('id', 'name', 'text').iterator():
+        terms = Counter(analyze(f'{recipe.name} {recipe.text}'))
+        RecipeSearchTerm.objects.bulk_create(
+            (
+                RecipeSearchTerm(
+                    recipe_id=recipe.id,
+                    term=term,
+                    frequency=min(frequency, 32767)
+                )
+                for term, frequency in terms.items()
+            ),
+            batch_size=1000
+        )
+        recipe.search_length = sum(terms.values())
+        recipes.append(recipe)
+    Recipe.objects.bulk_update(recipes, ['search_length'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_ingredient_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_length',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Длина в поисковом индексе'),
+        ),
+        migrations.CreateModel(
+            name='RecipeSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100, verbose_name='Основа слова')),
+                ('frequency', models.PositiveSmallIntegerField(default=1, verbose_name='Частота в рецепте')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Термин поискового индекса',
+                'verbose_name_plural': 'Поисковый индекс рецептов',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recipesearchterm',
+            constraint=models.UniqueConstraint(fields=('term', 'recipe'), name='unique_recipe_search_term'),
+        ),
+        migrations.RunPython(fill_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.15 on 2026-10-18 05:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0008_recipe_tags_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Pantry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='in_pantry', to='recipes.ingredient', verbose_name='Ингредиент в кладовой')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pantry', to=settings.AUTH_USER_MODEL, verbose_name='Владелец кладовой')),
+            ],
+            options={
+                'verbose_name': 'Продукт в кладовой',
+                'verbose_name_plural': 'Кладовая',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pantry',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_pantry'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.15 on 2026-10-18 06:24
+
+from django.db import migrations, models
+
+
+def fill_started(apps, schema_editor):
+    ShoppingListJob = apps.get_model('recipes', 'ShoppingListJob')
+    ShoppingListJob.objects.filter(status='running').update(
+        started=models.F('created')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_shopping_list_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shoppinglistjob',
+            name='started',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Дата начала обработки'),
+        ),
+        migrations.RunPython(fill_started, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 3.2.15 on 2026-10-18 06:39
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def fill_tag_keys(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    keys = defaultdict(dict)
+    for recipe_id, tag_id in Recipe.tags.through.objects.values_list(
+        'recipe_id', 'tag_id'
+    ):
+        keys[recipe_id][f't{tag_id}'] = True
+    Recipe.objects.bulk_update(
+        [Recipe(id=pk, tag_keys=value) for pk, value in keys.items()],
+        ['tag_keys'],
+        batch_size=1000
+    )
+
+
+def create_tag_keys_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipe_tag_keys_idx '
+        'ON recipes_recipe USING gin (tag_keys)'
+    )
+
+
+def drop_tag_keys_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS recipe_tag_keys_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_shopping_list_job_started'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_keys',
+            field=models.JSONField(default=dict, editable=False, verbose_name='Ключи тегов'),
+        ),
+        migrations.RunPython(fill_tag_keys, migrations.RunPython.noop),
+        migrations.RunPython(create_tag_keys_index, drop_tag_keys_index),
+        migrations.RemoveField(
+            model_name='recipe',
+            name='tags_mask',
+        ),
+    ]
@@ -2,9 +2,23 @@ from colorfield.fields import ColorField
 from django.core.validators import MinValueValidator
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
 
 User = get_user_model()
 
+# Колонки рецепта, которые меняются только через F() и update().
+DENORMALIZED_RECIPE_FIELDS = (
+    'favorites_count', 'shopping_cart_count', 'tag_keys', 'search_length',
+)
+
+
+def get_tag_keys(tag_ids):
+    """Теги рецепта для колонки tag_keys: ключи вида t<id тега>.
+
+    Чисто числовые ключи Django на SQLite принимает за индексы массива.
+    """
+    return {f't{tag_id}': True for tag_id in tag_ids}
+
 
 class Ingredient(models.Model):
     name = models.CharField(
@@ -98,9 +112,29 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок',
+        default=0,
+        editable=False
+    )
+    tag_keys = models.JSONField(
+        verbose_name='Ключи тегов',
+        default=dict,
+        editable=False
+    )
+    search_length = models.PositiveIntegerField(
+        verbose_name='Длина в поисковом индексе',
+        default=0,
+        editable=False
+    )
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         constraints = (
@@ -109,10 +143,31 @@ class Recipe(models.Model):
                 name='unique_recipe',
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx',
+            ),
+        )
 
     def __str__(self):
         return f'{self.name}'
 
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        # Полное сохранение загруженного рецепта (API, админка) не должно
+        # затирать счётчики и ключи тегов значениями на момент загрузки.
+        if (
+            update_fields is None and not force_insert
+            and not self._state.adding
+        ):
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in DENORMALIZED_RECIPE_FIELDS
+            ]
+        super().save(force_insert, force_update, using, update_fields)
+
 
 class IngredientInRecipe(models.Model):
     ingredient = models.ForeignKey(
@@ -148,6 +203,36 @@ class IngredientInRecipe(models.Model):
         return f'{self.ingredient.name}'
 
 
+class RecipeSearchTerm(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        verbose_name='Рецепт',
+    )
+    term = models.CharField(
+        verbose_name='Основа слова',
+        max_length=100
+    )
+    frequency = models.PositiveSmallIntegerField(
+        verbose_name='Частота в рецепте',
+        default=1
+    )
+
+    class Meta:
+        verbose_name = 'Термин поискового индекса'
+        verbose_name_plural = 'Поисковый индекс рецептов'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('term', 'recipe'),
+                name='unique_recipe_search_term',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.term} - {self.recipe}'
+
+
 class Subscribe(models.Model):
     user = models.ForeignKey(
         User,
@@ -167,13 +252,17 @@ class Subscribe(models.Model):
     )
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'author'],
                 name='unique_subscription')]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-id'],
+                name='subscribe_user_pub_date_idx')]
 
     def __str__(self):
         return f'{self.author}'
@@ -233,3 +322,156 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.author} планирует приготовить {self.recipe}'
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации рецепта'
+    )
+
+    class Meta:
+        ordering = ['-pub_date', '-id']
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_entry',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-id'),
+                name='feed_user_pub_date_idx',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
+
+
+class Pantry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='pantry',
+        verbose_name='Владелец кладовой',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='in_pantry',
+        verbose_name='Ингредиент в кладовой',
+    )
+
+    class Meta:
+        verbose_name = 'Продукт в кладовой'
+        verbose_name_plural = 'Кладовая'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_pantry',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.ingredient} есть у {self.user}'
+
+
+class ShoppingCartIngredient(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+        verbose_name='Владелец списка покупок',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='in_shopping_cart_totals',
+        verbose_name='Ингредиент',
+    )
+    amount = models.IntegerField(
+        verbose_name='Общее количество',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_cart_ingredient',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.ingredient}: {self.amount} для {self.user}'
+
+
+class ShoppingListJob(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'pending', _('В очереди')
+        RUNNING = 'running', _('Формируется')
+        DONE = 'done', _('Готов')
+        FAILED = 'failed', _('Ошибка')
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_jobs',
+        verbose_name='Владелец списка покупок',
+    )
+    key = models.CharField(
+        verbose_name='Хэш содержимого списка',
+        max_length=64,
+    )
+    items = models.JSONField(
+        verbose_name='Содержимое списка',
+    )
+    status = models.CharField(
+        verbose_name='Статус',
+        max_length=16,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+    created = models.DateTimeField(
+        verbose_name='Дата создания',
+        auto_now_add=True,
+    )
+    started = models.DateTimeField(
+        verbose_name='Дата начала обработки',
+        null=True,
+        blank=True,
+    )
+    finished = models.DateTimeField(
+        verbose_name='Дата завершения',
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Задача на список покупок'
+        verbose_name_plural = 'Задачи на списки покупок'
+        indexes = (
+            models.Index(
+                fields=('status', 'id'),
+                name='shopping_list_job_status_idx',
+            ),
+        )
+
+    def __str__(self):
+        return f'Список покупок {self.user}: {self.status}'